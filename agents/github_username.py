@@ -1,21 +1,83 @@
 import os
+import re
 import sys
 sys.path.append(os.getcwd())
 
-from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain_core.tools import Tool
-from langchain import hub
-from langchain.agents import create_react_agent, AgentExecutor
-from tools.tools import get_github_profile_url, get_github_user_details
+from typing import Optional
+
+import requests
 from output_parsers import github_user_parser
 from output_parsers import GitHubUser
+from util.github import get_client
+from util.username_cache import UsernameCache
+
+GITHUB_URL = re.compile(r'^(?:https?://)?(?:www\.)?github\.com/([A-Za-z0-9-]+)(?:[/?#].*)?$')
+GITHUB_USERNAME = re.compile(r'^@?([A-Za-z0-9](?:[A-Za-z0-9-]{0,37}[A-Za-z0-9])?)$')
+
+
+class UsernameNotFound(Exception):
+    """
+    The search agent could not find a GitHub username for a query.
+    """
+
+
+def resolve_username(query: str) -> Optional[str]:
+    """
+    Resolves a query that is already a GitHub username, `@username` or a
+    GitHub profile/repository URL, by checking it against the users API.
+    Returns None for anything else, e.g. a description of a person.
+    """
+    query = query.strip()
+    match = GITHUB_URL.match(query) or GITHUB_USERNAME.match(query)
+    if not match:
+        return None
+
+    try:
+        response = get_client().get(f"users/{match.group(1)}")
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()["login"]
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching GitHub user: {e}")
+        return None
+
+
+def get(name: str, debug: bool = False, cache: Optional[UsernameCache] = None) -> GitHubUser:
+    """
+    Returns the GitHub user for a query, trying in order:
+    - the username cache
+    - the query as a username or profile URL
+    - a ReAct agent that searches the web
+    """
+    username = cache.get(name) if cache else None
+    if username is not None:
+        print("Github username found in cache: " + username)
+    else:
+        username = resolve_username(name)
+        if username is None:
+            username = search(name, debug=debug).username
+        # Only a fresh lookup is stored, so cached usernames still expire
+        if cache:
+            cache.put(name, username)
+
+    if debug:
+        print("Github username found: " + username)
+
+    return GitHubUser(username=username)
 
-def get(name: str, debug: bool = False) -> GitHubUser:
-    llm = ChatOpenAI(
-        temperature=0,
-        model_name="gpt-4o-mini"
-    )
+
+def search(name: str, debug: bool = False) -> GitHubUser:
+    # Only the search path needs the agent dependencies
+    from langchain.prompts import PromptTemplate
+    from langchain_core.tools import Tool
+    from langchain.agents import create_react_agent, AgentExecutor
+    from agents.react_prompt import react_prompt
+    from chains.callbacks import MetricsCallbackHandler
+    from chains.chains import get_llm
+    from tools.tools import get_github_profile_url, get_github_user_details
+
+    llm = get_llm("gpt-4o-mini")
 
     template = """
         Follow the sequence of tasks, in order, take your time and do not rush.
@@ -53,8 +115,6 @@ def get(name: str, debug: bool = False) -> GitHubUser:
         ),
     ]
 
-    react_prompt = hub.pull("hwchase17/react")
-
     agent = create_react_agent(
         llm=llm,
         tools=tools_for_agent,
@@ -72,16 +132,13 @@ def get(name: str, debug: bool = False) -> GitHubUser:
         input={
             "input": prompt_template.format_prompt(name=name),
         },
+        config={"callbacks": [MetricsCallbackHandler("username_agent")]},
         handle_parsing_errors=True
     )
     github_user: GitHubUser = GitHubUser.parse_raw(result["output"])
 
     if github_user.username == "":
-        print("Could not find Github username for " + name)
-        exit(1)
-
-    if debug:
-        print("Github username found: " + github_user.username)
+        raise UsernameNotFound("Could not find Github username for " + name)
 
     return github_user
 
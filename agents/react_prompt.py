@@ -0,0 +1,25 @@
+from langchain.prompts import PromptTemplate
+
+# Vendored copy of the "hwchase17/react" prompt from the LangChain hub,
+# so it is not downloaded on every run.
+template = """Answer the following questions as best you can. You have access to the following tools:
+
+{tools}
+
+Use the following format:
+
+Question: the input question you must answer
+Thought: you should always think about what to do
+Action: the action to take, should be one of [{tool_names}]
+Action Input: the input to the action
+Observation: the result of the action
+... (this Thought/Action/Action Input/Observation can repeat N times)
+Thought: I now know the final answer
+Final Answer: the final answer to the original input question
+
+Begin!
+
+Question: {input}
+Thought:{agent_scratchpad}"""
+
+react_prompt = PromptTemplate.from_template(template)
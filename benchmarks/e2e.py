@@ -0,0 +1,195 @@
+"""
+Offline end-to-end benchmark for `create_report`.
+
+GitHub is replaced by a local HTTP server (`benchmarks.fake_github`) and
+OpenAI by a chat model with configurable latency and throughput
+(`benchmarks.fake_llm`), so runs are repeatable and free. Each scenario
+runs in a fresh working directory, so the first run is cold and any
+`--repeat` runs reuse the on-disk caches.
+
+Results are appended as JSON lines to `--output`, one line per run.
+
+    python benchmarks/e2e.py
+    python benchmarks/e2e.py --scales small medium --llm-latency 1 --llm-tokens-per-second 50 --repeat 2
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fake_github import FakeGitHub
+from benchmarks.fake_llm import FakeChatModel
+from benchmarks.fixtures import SCALES, make_user
+
+USERNAME = "bench-user"
+
+
+@contextlib.contextmanager
+def fake_llm(llm: FakeChatModel):
+    """
+    Makes every chain use `llm`, rebuilding the cached chains around it.
+    """
+    import chains.chains
+
+    factories = [chains.chains.get_repository_summary_chain,
+                 chains.chains.get_repository_reduce_chain,
+                 chains.chains.get_user_summary_chain]
+    get_llm = chains.chains.get_llm
+
+    chains.chains.get_llm = lambda model_name: llm
+    for factory in factories:
+        factory.cache_clear()
+    try:
+        yield llm
+    finally:
+        chains.chains.get_llm = get_llm
+        for factory in factories:
+            factory.cache_clear()
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_scenario(scale: str, args) -> List[Dict]:
+    import util.github
+    from main import create_report
+    from util.config import Config
+    from util.metrics import get_metrics
+
+    github = FakeGitHub({USERNAME: make_user(USERNAME, scale)},
+                        latency=args.github_latency,
+                        rate_limit=args.github_rate_limit,
+                        rate_limit_window=args.github_rate_limit_window,
+                        failure_rate=args.github_failure_rate).start()
+    api_url = util.github.GITHUB_API_URL
+    util.github.GITHUB_API_URL = github.url
+
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    os.symlink(os.path.join(ROOT, "static"), os.path.join(workdir, "static"))
+    os.makedirs(os.path.join(workdir, "reports"))
+
+    devnull = open(os.devnull, "w")
+    results = []
+    try:
+        os.chdir(workdir)
+        for run in range(args.repeat):
+            github.reset_stats()
+            llm = FakeChatModel(latency=args.llm_latency,
+                                tokens_per_second=args.llm_tokens_per_second,
+                                completion_tokens=args.llm_completion_tokens)
+
+            config = Config()
+            config.set('max_repos', SCALES[scale]["max_repos"])
+            config.set('max_files_per_repo', SCALES[scale]["files_per_repo"])
+            config.set('discovery_mode', args.discovery_mode)
+            config.set('fetch_mode', args.fetch_mode)
+            config.set('stream', args.stream)
+            config.set('pipeline', not args.no_pipeline)
+            if args.batch:
+                config.set('batch', True)
+                config.set('batch_backend', 'local')
+            config.set('llm_requests_per_minute', args.llm_requests_per_minute)
+            config.set('llm_tokens_per_minute', args.llm_tokens_per_minute)
+
+            output = sys.stdout if args.verbose else devnull
+            start = time.perf_counter()
+            with fake_llm(llm), contextlib.redirect_stdout(output):
+                create_report(query=USERNAME, config=config)
+            end = time.perf_counter()
+
+            metrics = get_metrics().summary()
+            results.append({
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "scale": scale,
+                "run": run + 1,
+                "cache": "cold" if run == 0 else "warm",
+                "settings": {
+                    "discovery_mode": args.discovery_mode,
+                    "fetch_mode": args.fetch_mode,
+                    "stream": args.stream,
+                    "pipeline": not args.no_pipeline,
+                    "batch": args.batch,
+                    "github_latency": args.github_latency,
+                    "github_rate_limit": args.github_rate_limit,
+                    "github_rate_limit_window": args.github_rate_limit_window,
+                    "github_failure_rate": args.github_failure_rate,
+                    "llm_latency": args.llm_latency,
+                    "llm_tokens_per_second": args.llm_tokens_per_second,
+                    "llm_completion_tokens": args.llm_completion_tokens,
+                    "llm_requests_per_minute": config.get('llm_requests_per_minute'),
+                    "llm_tokens_per_minute": config.get('llm_tokens_per_minute'),
+                },
+                "wall_seconds": end - start,
+                "stages": metrics["stages"],
+                "github": github.stats(),
+                "github_client": {k: v for k, v in metrics["github"].items() if k != "rate_limit"},
+                "llm": metrics["llm"],
+                "reports": len(os.listdir("reports")),
+            })
+    finally:
+        os.chdir(cwd)
+        devnull.close()
+        shutil.rmtree(workdir)
+        util.github.GITHUB_API_URL = api_url
+        github.stop()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark create_report against local GitHub and LLM stand-ins')
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=['small'], help='Fixture sizes to run')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per scale, runs after the first reuse the caches')
+    parser.add_argument('--discovery-mode', choices=['tree', 'contents'], default='tree', help='How to find .tf files in each repository')
+    parser.add_argument('--fetch-mode', choices=['contents', 'archive'], default='contents', help='How to download .tf files from each repository')
+    parser.add_argument('--stream', action='store_true', help='Stream reports to disk')
+    parser.add_argument('--no-pipeline', action='store_true', help='Run each stage for every repository before starting the next stage')
+    parser.add_argument('--batch', action='store_true', help='Review every repository in one batch, with the local batch backend')
+    parser.add_argument('--github-latency', type=float, default=0.02, help='Seconds added to every GitHub response')
+    parser.add_argument('--github-rate-limit', type=int, default=5000, help='GitHub requests allowed per rate limit window')
+    parser.add_argument('--github-rate-limit-window', type=int, default=3600, help='Seconds until the GitHub rate limit resets')
+    parser.add_argument('--github-failure-rate', type=float, default=0.0, help='Share of GitHub requests that fail with a 502 or a secondary rate limit')
+    parser.add_argument('--llm-latency', type=float, default=0.5, help='Seconds before the first LLM token')
+    parser.add_argument('--llm-tokens-per-second', type=float, default=200, help='LLM output throughput')
+    parser.add_argument('--llm-completion-tokens', type=int, default=400, help='Tokens in every LLM reply')
+    parser.add_argument('--llm-requests-per-minute', type=int, help='LLM requests per minute budget, default is the report default')
+    parser.add_argument('--llm-tokens-per-minute', type=int, help='LLM tokens per minute budget, default is the report default')
+    parser.add_argument('--output', type=str, default=os.path.join(ROOT, 'benchmarks', 'results.jsonl'), help='JSON lines file results are appended to')
+    parser.add_argument('--verbose', action='store_true', help='Show the output of create_report')
+    args = parser.parse_args()
+
+    for scale in args.scales:
+        for result in run_scenario(scale, args):
+            print("%s (%s): %.2fs, %s GitHub requests, %s bytes, %s LLM calls" % (
+                scale, result["cache"], result["wall_seconds"], result["github"]["requests"],
+                result["github"]["bytes_sent"], result["llm"]["calls"]))
+            for name, seconds in result["stages"].items():
+                print("  %-12s %.2fs" % (name, seconds))
+
+            with open(args.output, "a") as file:
+                file.write(json.dumps(result) + "\n")
+
+    print("Results appended to " + args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+import base64
+import gzip
+import hashlib
+import io
+import json
+import random
+import tarfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.fixtures import git_sha, languages, tree
+
+
+class FakeGitHub:
+    """
+    Local stand-in for the GitHub REST API, serving synthetic users from
+    `benchmarks.fixtures`.
+
+    Emulates the endpoints the report uses: users, sorted and paginated
+    user and organization repositories (with `Link` headers), languages, recursive trees,
+    contents and tarballs. Every response carries `X-RateLimit-*` headers and an ETag,
+    and `If-None-Match` is answered with a 304 that is not counted against
+    the rate limit, as on GitHub.
+
+    `latency` adds a delay, in seconds, to every response, and
+    `failure_rate` is the share of requests that fail with a 502 or a
+    secondary rate limit. The rate limit budget is refilled every
+    `rate_limit_window` seconds.
+    """
+
+    def __init__(self,
+                 users: Dict[str, Dict],
+                 latency: float = 0.0,
+                 rate_limit: int = 5000,
+                 rate_limit_window: int = 3600,
+                 failure_rate: float = 0.0,
+                 seed: int = 0):
+        self.users = users
+        self.repos = {r["full_name"]: r for u in users.values() for r in u["repos"]}
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_limit_window = rate_limit_window
+        self.rate_limit_reset = int(time.time()) + rate_limit_window
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+
+        self.requests = Counter()
+        self.failures = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self.rate_limit_remaining = rate_limit
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return "http://%s:%s" % (host, port)
+
+    def start(self) -> "FakeGitHub":
+        handler = type("Handler", (_Handler,), {"github": self})
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests.clear()
+            self.failures = 0
+            self.not_modified = 0
+            self.bytes_sent = 0
+            self.rate_limit_remaining = self.rate_limit
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "requests": sum(self.requests.values()),
+                "requests_by_endpoint": dict(self.requests),
+                "failures": self.failures,
+                "not_modified": self.not_modified,
+                "bytes_sent": self.bytes_sent,
+                "rate_limit_remaining": self.rate_limit_remaining,
+            }
+
+    def route(self, path: str, query: Dict, base_url: str, accept: Optional[str] = None) -> Tuple[str, int, Dict, bytes]:
+        """
+        Returns the endpoint name, status, extra headers and body for a request.
+        """
+        parts = path.strip("/").split("/")
+
+        if parts[0] == "users" and len(parts) == 2:
+            if parts[1] not in self.users:
+                return "users", 404, {}, _json({"message": "Not Found"})
+            return "users", 200, {}, _json({"login": parts[1], "type": "User"})
+
+        if parts[0] in ("users", "orgs") and len(parts) == 3 and parts[2] == "repos":
+            return (parts[0][:-1] + "_repos",) + self._user_repos(parts[1], query, base_url, parts[0])
+
+        if parts[0] != "repos" or len(parts) < 4:
+            return "unknown", 404, {}, _json({"message": "Not Found"})
+
+        repo = self.repos.get(parts[1] + "/" + parts[2])
+        if repo is None:
+            return parts[3], 404, {}, _json({"message": "Not Found"})
+
+        if parts[3] == "git" and len(parts) >= 6 and parts[4] == "trees":
+            return "trees", 200, {}, _json({
+                "sha": git_sha(repo["full_name"]),
+                "tree": tree(repo),
+                "truncated": False,
+            })
+
+        if parts[3] == "languages":
+            return "languages", 200, {}, _json(languages(repo))
+
+        if parts[3] == "contents":
+            return ("contents",) + self._contents(repo, "/".join(parts[4:]), raw=accept == "application/vnd.github.raw")
+
+        if parts[3] == "tarball":
+            return "tarball", 200, {"Content-Type": "application/x-gzip"}, _tarball(repo)
+
+        return parts[3], 404, {}, _json({"message": "Not Found"})
+
+    def _user_repos(self, username: str, query: Dict, base_url: str, owners: str = "users") -> Tuple[int, Dict, bytes]:
+        user = self.users.get(username)
+        if user is None:
+            return 404, {}, _json({"message": "Not Found"})
+
+        per_page = min(int(query.get("per_page", ["30"])[0]), 100)
+        page = int(query.get("page", ["1"])[0])
+        sort = query.get("sort", ["full_name"])[0]
+        direction = query.get("direction", ["asc" if sort == "full_name" else "desc"])[0]
+
+        # ISO 8601 timestamps in the same timezone sort as strings
+        field = {"pushed": "pushed_at", "updated": "updated_at", "full_name": "full_name"}.get(sort, "full_name")
+        repos = sorted(user["repos"], key=lambda r: r[field], reverse=direction == "desc")
+        last = max((len(repos) + per_page - 1) // per_page, 1)
+        extra = "".join("&%s=%s" % (k, query[k][0]) for k in ("type", "sort", "direction") if k in query)
+
+        body = [{k: v for k, v in r.items() if k != "files"}
+                for r in repos[(page - 1) * per_page:page * per_page]]
+
+        links = []
+        if page < last:
+            links.append('<%s/%s/%s/repos?per_page=%s&page=%s%s>; rel="next"' % (base_url, owners, username, per_page, page + 1, extra))
+            links.append('<%s/%s/%s/repos?per_page=%s&page=%s%s>; rel="last"' % (base_url, owners, username, per_page, last, extra))
+        return 200, {"Link": ", ".join(links)} if links else {}, _json(body)
+
+    def _contents(self, repo: Dict, path: str, raw: bool = False) -> Tuple[int, Dict, bytes]:
+        path = path.strip("/")
+        if path in repo["files"]:
+            content = repo["files"][path]
+            if raw:
+                return 200, {"Content-Type": "application/vnd.github.raw"}, content.encode("utf-8")
+            return 200, {}, _json({
+                "type": "file",
+                "name": path.rsplit("/", 1)[-1],
+                "path": path,
+                "sha": git_sha(content),
+                "encoding": "base64",
+                "content": base64.b64encode(content.encode("utf-8")).decode("ascii"),
+            })
+
+        prefix = path + "/" if path else ""
+        listing = {}
+        for file_path, content in repo["files"].items():
+            if not file_path.startswith(prefix):
+                continue
+            name = file_path[len(prefix):].split("/", 1)[0]
+            is_dir = "/" in file_path[len(prefix):]
+            listing[name] = {
+                "type": "dir" if is_dir else "file",
+                "name": name,
+                "path": prefix + name,
+                "sha": git_sha(prefix + name) if is_dir else git_sha(content),
+            }
+
+        if not listing:
+            return 404, {}, _json({"message": "Not Found"})
+        return 200, {}, _json([listing[name] for name in sorted(listing)])
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    github: Optional[FakeGitHub] = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        github = self.github
+        if github.latency:
+            time.sleep(github.latency)
+
+        url = urlparse(self.path)
+        base_url = "http://" + self.headers.get("Host", "127.0.0.1")
+        endpoint, status, headers, body = github.route(url.path, parse_qs(url.query), base_url, self.headers.get("Accept"))
+
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        not_modified = status == 200 and self.headers.get("If-None-Match") == etag
+
+        with github._lock:
+            if time.time() >= github.rate_limit_reset:
+                github.rate_limit_remaining = github.rate_limit
+                github.rate_limit_reset = int(time.time()) + github.rate_limit_window
+
+            github.requests[endpoint] += 1
+            if github._random.random() < github.failure_rate:
+                github.failures += 1
+                not_modified = False
+                if github._random.random() < 0.5:
+                    status, headers, body = 502, {}, _json({"message": "Server Error"})
+                else:
+                    status, headers = 403, {"Retry-After": "1"}
+                    body = _json({"message": "You have exceeded a secondary rate limit"})
+            elif not_modified:
+                github.not_modified += 1
+            elif github.rate_limit_remaining > 0:
+                github.rate_limit_remaining -= 1
+            else:
+                status, headers, body = 403, {}, _json({"message": "API rate limit exceeded"})
+            remaining = github.rate_limit_remaining
+            if not not_modified:
+                github.bytes_sent += len(body)
+
+        self.send_response(304 if not_modified else status)
+        self.send_header("X-RateLimit-Limit", str(github.rate_limit))
+        self.send_header("X-RateLimit-Remaining", str(remaining))
+        self.send_header("X-RateLimit-Reset", str(github.rate_limit_reset))
+        self.send_header("X-RateLimit-Used", str(github.rate_limit - remaining))
+        self.send_header("X-RateLimit-Resource", "core")
+        self.send_header("ETag", etag)
+        if not_modified:
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        headers.setdefault("Content-Type", "application/json; charset=utf-8")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _json(data) -> bytes:
+    return json.dumps(data).encode("utf-8")
+
+
+def _tarball(repo: Dict) -> bytes:
+    # Members are prefixed with a "<owner>-<repo>-<sha>/" directory, like GitHub's archives
+    prefix = "%s-%s/" % (repo["full_name"].replace("/", "-"), git_sha(repo["full_name"])[:7])
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as archive:
+        for file_path, content in sorted(repo["files"].items()):
+            data = content.encode("utf-8")
+            info = tarfile.TarInfo(prefix + file_path)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return gzip.compress(buffer.getvalue(), mtime=0)
@@ -0,0 +1,101 @@
+import asyncio
+import re
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from util.tokens import count_tokens
+
+FULL_NAME = re.compile(r'Full Name: (\S+)')
+OWNER = re.compile(r'Owner: (\S+)')
+FILE_PATH = re.compile(r"'file_path': '([^']+)'")
+REPOSITORY = re.compile(r'^\s*- (\S+): \S+/10 over', re.MULTILINE)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model stand-in for benchmarks.
+
+    Waits `latency` seconds before the first token, then produces
+    `completion_tokens` tokens at `tokens_per_second`, both when invoked and
+    when streamed. Replies are a minimal report for the repository or user
+    named in the prompt, with a scored feedback section for every file in
+    the prompt, or a sentence per repository for the user summary, and
+    token usage like OpenAI's.
+    """
+
+    latency: float = 0.5
+    tokens_per_second: float = 100.0
+    completion_tokens: int = 400
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def _reply(self, messages: List[BaseMessage]) -> Tuple[List[str], Dict[str, int]]:
+        prompt = "\n".join(str(m.content) for m in messages)
+        full_name = FULL_NAME.search(prompt)
+        owner = OWNER.search(prompt)
+        title = full_name.group(1) if full_name else (owner.group(1) if owner else "unknown")
+
+        file_paths = list(dict.fromkeys(FILE_PATH.findall(prompt)))
+        repositories = REPOSITORY.findall(prompt)
+        filler = max(self.completion_tokens - 20, 0)
+
+        if repositories and not file_paths:
+            words = []
+            for i, name in enumerate(repositories):
+                words += ["- **%s:** " % name]
+                words += ["lorem "] * (filler // len(repositories) + (i < filler % len(repositories)))
+                words += ["\n"]
+        else:
+            words = ["# IaC Repository Report: %s\n\n## Feedback\n" % title]
+            for i, file_path in enumerate(file_paths):
+                words += ["\n### %s\n- **Score:** 7/10\n- **Feedback:** " % file_path]
+                words += ["lorem "] * (filler // len(file_paths) + (i < filler % len(file_paths)))
+            if not file_paths:
+                words += ["lorem "] * filler
+            words += ["\n\n**Total Score:** 7/10\n"]
+
+        usage = {
+            "input_tokens": count_tokens(prompt),
+            "output_tokens": self.completion_tokens,
+            "total_tokens": count_tokens(prompt) + self.completion_tokens,
+        }
+        return words, usage
+
+    def _duration(self) -> float:
+        return self.latency + self.completion_tokens / self.tokens_per_second
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        words, usage = self._reply(messages)
+        time.sleep(self._duration())
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(words), usage_metadata=usage))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        words, usage = self._reply(messages)
+        await asyncio.sleep(self._duration())
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(words), usage_metadata=usage))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        words, usage = self._reply(messages)
+        time.sleep(self.latency)
+        for word in words:
+            time.sleep(1 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=usage))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        words, usage = self._reply(messages)
+        await asyncio.sleep(self.latency)
+        for word in words:
+            await asyncio.sleep(1 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=usage))
@@ -0,0 +1,100 @@
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from util import mock
+
+# Number of repositories, how often one is a Terraform repository and .tf files per Terraform repository
+SCALES = {
+    "small": {"repos": 8, "hcl_every": 2, "files_per_repo": 5, "max_repos": 3},
+    "medium": {"repos": 60, "hcl_every": 3, "files_per_repo": 15, "max_repos": 10},
+    "large": {"repos": 300, "hcl_every": 3, "files_per_repo": 40, "max_repos": 30},
+}
+
+
+def git_sha(content: str) -> str:
+    """
+    Returns the Git blob SHA of `content`, as the Trees API would.
+    """
+    data = content.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def make_user(username: str, scale: str) -> Dict:
+    """
+    Builds a synthetic GitHub user for a benchmark scale.
+
+    Every `hcl_every` repository is a Terraform repository whose files are
+    copied from the mock repository in `util/mock.py`, spread over a few
+    directories. One in four of them also has enough scripts that
+    HCL is its primary language but less than 50% of its code. The others
+    are forks or non HCL repositories that the report has to filter out.
+    Repositories are listed by name, i.e. not sorted by `pushed_at`.
+    """
+    settings = SCALES[scale]
+    templates = mock.get()[0]["files"]
+    now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    repos = []
+    for i in range(settings["repos"]):
+        name = "repo-%03d" % i
+        is_hcl = i % settings["hcl_every"] == 0
+        is_fork = not is_hcl and i % 2 == 0
+
+        files = {}
+        if is_hcl:
+            for j in range(settings["files_per_repo"]):
+                template = templates[j % len(templates)]
+                directory = ["", "modules/network/", "deploy/app/"][j % 3]
+                file_path = "%s%s-%s" % (directory, j, template["file_path"].rsplit("/", 1)[-1])
+                files[file_path] = template["content"]
+            files["README.md"] = "# %s\n" % name
+
+            if (i // settings["hcl_every"]) % 4 == 1:
+                hcl_bytes = sum(len(c) for c in files.values())
+                files["scripts/setup.sh"] = "echo setup\n" * (hcl_bytes * 6 // 110)
+                files["scripts/deploy.py"] = "print('deploy')\n" * (hcl_bytes * 5 // 160)
+        else:
+            files["main.py"] = "print('%s')\n" % name
+
+        repos.append({
+            "name": name,
+            "full_name": "%s/%s" % (username, name),
+            "owner": {"login": username},
+            "fork": is_fork,
+            "language": "HCL" if is_hcl else "Python",
+            "default_branch": "main",
+            # Spread pushes out, in a different order to the repository index
+            "pushed_at": (now - timedelta(hours=(i * 7919) % settings["repos"])).isoformat(),
+            "updated_at": (now - timedelta(hours=(i * 104729) % settings["repos"])).isoformat(),
+            "files": files,
+        })
+
+    return {"login": username, "repos": repos}
+
+
+def languages(repo: Dict) -> Dict[str, int]:
+    """
+    Returns the bytes of code per language of a synthetic repository, as the languages API would.
+    """
+    extensions = {".tf": "HCL", ".sh": "Shell", ".py": "Python"}
+    counts = {}
+    for file_path, content in repo["files"].items():
+        language = extensions.get(file_path[file_path.rfind("."):])
+        if language:
+            counts[language] = counts.get(language, 0) + len(content)
+    return dict(sorted(counts.items(), key=lambda c: c[1], reverse=True))
+
+
+def tree(repo: Dict) -> List[Dict]:
+    """
+    Returns the recursive Git tree of a synthetic repository.
+    """
+    entries = {}
+    for file_path, content in sorted(repo["files"].items()):
+        parts = file_path.split("/")
+        for depth in range(1, len(parts)):
+            directory = "/".join(parts[:depth])
+            entries[directory] = {"path": directory, "type": "tree", "sha": git_sha(directory)}
+        entries[file_path] = {"path": file_path, "type": "blob", "sha": git_sha(content), "size": len(content)}
+    return [entries[path] for path in sorted(entries)]
@@ -0,0 +1,74 @@
+"""
+Startup benchmark for the CLI.
+
+Runs `python -X importtime main.py --help` and reports the wall time and
+the slowest imports, so import regressions are visible.
+
+    python benchmarks/importtime.py
+    python benchmarks/importtime.py --runs 10 --max-ms 500
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_once():
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "main.py", "--help"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+
+    imports = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        imports.append((name.rstrip(), int(cumulative) / 1000))
+
+    return wall_ms, imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure CLI startup time')
+    parser.add_argument('--runs', type=int, default=5, help='Number of runs, the fastest is reported')
+    parser.add_argument('--top', type=int, default=10, help='Number of slowest top level imports to show')
+    parser.add_argument('--max-ms', type=float, help='Exit with an error if startup is slower than this')
+    parser.add_argument('--output', type=str, help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    wall_ms, imports = min(runs, key=lambda r: r[0])
+
+    # Top level imports are the ones that are not indented
+    top_level = sorted(
+        [(name.strip(), ms) for name, ms in imports if not name.startswith("  ")],
+        key=lambda i: i[1], reverse=True,
+    )[:args.top]
+
+    print("main.py --help: %.1f ms (best of %s)" % (wall_ms, args.runs))
+    for name, ms in top_level:
+        print("  %8.1f ms  %s" % (ms, name))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({
+                "wall_ms": wall_ms,
+                "runs": args.runs,
+                "imports": [{"name": name, "cumulative_ms": ms} for name, ms in top_level],
+            }, file, indent=2)
+
+    if args.max_ms is not None and wall_ms > args.max_ms:
+        print("Startup is slower than %.1f ms" % args.max_ms)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,354 @@
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from chains.review import findings_for_batch, review_fingerprint, save_reviews, select_files
+from util.checkpoint import RunStore
+from util.file_reviews import FileReviewStore, file_shas, relocate
+from util.fs import write_file_to_disk
+from util.hcl import strip_noise
+from util.metrics import get_metrics
+from util.precheck import CHECKED_RULES, check_files, format_findings
+from util.report import parse_file_sections, render_repository_report
+from util.style_guide import StyleGuide
+from util.tokens import pack_files
+from util.triage import Triage
+
+# Batch statuses after which a batch no longer changes
+FINISHED = ("completed", "failed", "expired", "cancelled")
+
+
+class BatchBackend:
+    """
+    A batch completion endpoint. Takes a JSONL file of chat completion
+    requests, in OpenAI's batch input format, and returns the replies, in
+    its output format, once the whole batch has been processed.
+    """
+
+    def submit(self, path: str) -> str:
+        """
+        Submits the requests in `path`, returning the batch ID.
+        """
+        raise NotImplementedError
+
+    def status(self, batch_id: str) -> str:
+        raise NotImplementedError
+
+    def results(self, batch_id: str) -> List[Dict]:
+        """
+        Returns a `{"custom_id", "response", "error"}` line per processed request.
+        """
+        raise NotImplementedError
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """
+    OpenAI's Batch API: requests are processed within 24 hours at half the
+    price of synchronous requests, and do not count against the rate limits
+    of synchronous requests.
+    """
+
+    def __init__(self):
+        from openai import OpenAI
+
+        self.client = OpenAI()
+
+    def submit(self, path: str) -> str:
+        with open(path, "rb") as file:
+            input_file = self.client.files.create(file=file, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        return self.client.batches.retrieve(batch_id).status
+
+    def results(self, batch_id: str) -> List[Dict]:
+        # Expired and cancelled batches still return the requests that were processed
+        batch = self.client.batches.retrieve(batch_id)
+        lines = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                lines += [json.loads(l) for l in self.client.files.content(file_id).text.splitlines() if l.strip()]
+        return lines
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    Local stand-in for a batch endpoint, for tests and offline runs. Batches
+    are stored in `directory` and processed on the first status check after
+    they are submitted, with the chat models returned by `get_llm`.
+    """
+
+    def __init__(self, directory: str = ".cache/batches", get_llm: Optional[Callable] = None, workers: int = 16):
+        self.directory = directory
+        self.get_llm = get_llm
+        self.workers = workers
+        os.makedirs(directory, exist_ok=True)
+
+    def _file(self, batch_id: str, name: str) -> str:
+        return os.path.join(self.directory, batch_id, name)
+
+    def _set_status(self, batch_id: str, status: str):
+        write_file_to_disk(json.dumps({"id": batch_id, "status": status}), self._file(batch_id, "batch.json"))
+
+    def submit(self, path: str) -> str:
+        batch_id = "batch_local_" + uuid.uuid4().hex
+        os.makedirs(os.path.join(self.directory, batch_id))
+        with open(path, "r") as file:
+            write_file_to_disk(file.read(), self._file(batch_id, "input.jsonl"))
+        self._set_status(batch_id, "in_progress")
+        return batch_id
+
+    def _llm(self, model_name: str):
+        if self.get_llm is not None:
+            return self.get_llm(model_name)
+
+        from chains.chains import get_llm
+        return get_llm(model_name)
+
+    def _process(self, request: Dict) -> Dict:
+        body = request["body"]
+        try:
+            message = self._llm(body["model"]).invoke([(m["role"], m["content"]) for m in body["messages"]])
+        except Exception as e:
+            return {"custom_id": request["custom_id"], "response": None,
+                    "error": {"code": type(e).__name__, "message": str(e)}}
+
+        usage = message.usage_metadata or {}
+        return {"custom_id": request["custom_id"], "error": None, "response": {"status_code": 200, "body": {
+            "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": message.content}}],
+            "usage": {
+                "prompt_tokens": usage.get("input_tokens", 0),
+                "completion_tokens": usage.get("output_tokens", 0),
+                "total_tokens": usage.get("total_tokens", 0),
+            },
+        }}}
+
+    def status(self, batch_id: str) -> str:
+        with open(self._file(batch_id, "batch.json"), "r") as file:
+            status = json.load(file)["status"]
+        if status != "in_progress":
+            return status
+
+        with open(self._file(batch_id, "input.jsonl"), "r") as file:
+            requests = [json.loads(l) for l in file if l.strip()]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            lines = list(pool.map(self._process, requests))
+
+        write_file_to_disk("".join(json.dumps(l) + "\n" for l in lines), self._file(batch_id, "output.jsonl"))
+        self._set_status(batch_id, "completed")
+        return "completed"
+
+    def results(self, batch_id: str) -> List[Dict]:
+        with open(self._file(batch_id, "output.jsonl"), "r") as file:
+            return [json.loads(l) for l in file if l.strip()]
+
+
+def get_batch_backend(name: str, directory: str = ".cache/batches") -> BatchBackend:
+    if name == "local":
+        return LocalBatchBackend(directory)
+    return OpenAIBatchBackend()
+
+
+def plan_batch(repos_with_contents: List[Dict],
+               repository_summary_chain,
+               style_guide: StyleGuide,
+               batch_tokens: int = 12000,
+               precheck: bool = True,
+               file_reviews: Optional[FileReviewStore] = None,
+               triage: Optional[Triage] = None) -> Dict:
+    """
+    Renders the repository summary prompt of every file that needs the LLM
+    into a batch request, and plans how to assemble each repository's
+    report from the replies.
+
+    Files are selected as in `review_repository`, see `select_files`, so
+    with `file_reviews` a blob found in several repositories is only
+    requested once.
+
+    Returns `{"fingerprint", "requests", "repositories"}`. For each
+    repository, by full name, the plan has the sections that are already
+    known, the blob SHA and findings of every file waiting for a reply, and
+    the SHAs of the blobs it requested.
+    """
+    llm = repository_summary_chain.last
+    prechecked_rules = CHECKED_RULES if precheck else []
+    fingerprint = review_fingerprint(repository_summary_chain, style_guide, precheck)
+
+    requests = []
+    repositories = {}
+
+    for repo in repos_with_contents:
+        findings = check_files(repo["files"]) if precheck else []
+        shas = file_shas(repo)
+        selection = select_files(repo, shas, findings, fingerprint, file_reviews, triage)
+        owned = selection["owned"]
+
+        # Blobs another repository of this batch requested are taken from its reply
+        waiting = {}
+        for file_path in [f["file_path"] for f in owned] + list(selection["waiting"]):
+            waiting[file_path] = {"sha": shas[file_path],
+                                  "findings": [x for x in findings if x["file_path"] == file_path]}
+
+        files = [{"file_path": f["file_path"], "content": strip_noise(f["content"])} for f in owned]
+        batches = pack_files(files, batch_tokens)
+        for i, batch in enumerate(batches):
+            inputs = {
+                "owner": repo["owner"],
+                "name": repo["name"],
+                "full_name": repo["full_name"],
+                "terraform_style_guide": style_guide.for_files(batch, exclude=prechecked_rules),
+                "terraform_files": batch,
+                "prechecked_rules": ", ".join(prechecked_rules) or "None",
+                "precomputed_findings": format_findings(findings_for_batch(findings, batch)),
+            }
+            requests.append({
+                "custom_id": "%s#%s" % (repo["full_name"], i),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": getattr(llm, "model_name", None),
+                    "temperature": getattr(llm, "temperature", 0),
+                    "messages": [{"role": "user", "content": repository_summary_chain.first.format(**inputs)}],
+                },
+            })
+
+        repositories[repo["full_name"]] = {
+            "unchanged": selection["unchanged"],
+            "reviewed": len(owned),
+            "sections": selection["sections"],
+            "triaged": selection["triaged"],
+            "owned": [shas[f["file_path"]] for f in owned],
+            "waiting": waiting,
+            "requests": {"%s#%s" % (repo["full_name"], i): [part["file_path"] for part in batch]
+                         for i, batch in enumerate(batches)},
+        }
+
+    return {"fingerprint": fingerprint, "requests": requests, "repositories": repositories}
+
+
+def wait_for_batch(backend: BatchBackend, batch_id: str, poll_seconds: float = 60) -> str:
+    """
+    Polls a batch until it is finished, returning its final status.
+    """
+    while True:
+        status = backend.status(batch_id)
+        if status in FINISHED:
+            return status
+        print("Batch %s is %s, checking again in %ss" % (batch_id, status, poll_seconds))
+        time.sleep(poll_seconds)
+
+
+def review_in_batch(repos_with_contents: List[Dict],
+                    backend: BatchBackend,
+                    run: RunStore,
+                    repository_summary_chain,
+                    style_guide: StyleGuide,
+                    batch_tokens: int = 12000,
+                    precheck: bool = True,
+                    file_reviews: Optional[FileReviewStore] = None,
+                    triage: Optional[Triage] = None,
+                    reports_dir: str = "reports",
+                    poll_seconds: float = 60,
+                    on_report: Optional[Callable[[Dict, str], None]] = None) -> List[str]:
+    """
+    Reviews every repository with a single batch, instead of a request per
+    repository, then writes each report to <reports_dir>/<name>.md.
+
+    The batch ID and plan are saved in `run` as soon as the batch is
+    submitted, so an interrupted run resumed with `--resume` waits for the
+    same batch rather than submitting another.
+
+    Reports are assembled from the feedback section of each file. Files
+    without a section in the replies, e.g. because their request failed,
+    are not stored, so they are reviewed again next time.
+    """
+    def release(plan: Dict, reviewed: Dict[str, Dict]):
+        # Claims are only held by the process that planned the batch, releasing them is a no-op after --resume
+        if file_reviews:
+            for repository in plan["repositories"].values():
+                for sha in repository.get("owned", []):
+                    file_reviews.release(plan["fingerprint"], sha, reviewed.get(sha))
+
+    def submit() -> List[Dict]:
+        plan = plan_batch(repos_with_contents, repository_summary_chain, style_guide,
+                          batch_tokens, precheck, file_reviews, triage)
+        if not plan["requests"]:
+            return [{"batch_id": None, "plan": plan}]
+
+        try:
+            path = os.path.join(run.path, "batch_requests.jsonl")
+            write_file_to_disk("".join(json.dumps(r) + "\n" for r in plan["requests"]), path)
+            batch_id = backend.submit(path)
+        except BaseException:
+            # Reviews waiting for these blobs in this process review them themselves
+            release(plan, {})
+            raise
+        print("Submitted batch %s with %s requests" % (batch_id, len(plan["requests"])))
+        return [{"batch_id": batch_id, "plan": plan}]
+
+    batch = run.stage("batch", submit)[0]
+    batch_id, plan = batch["batch_id"], batch["plan"]
+
+    replies = {}
+    if batch_id:
+        status = wait_for_batch(backend, batch_id, poll_seconds)
+        print("Batch %s is %s" % (batch_id, status))
+
+        name = repository_summary_chain.get_name() + "_batch"
+        for line in backend.results(batch_id):
+            response = line.get("response") or {}
+            body = response.get("body") or {}
+            usage = body.get("usage") or {}
+            now = time.perf_counter()
+            error = None
+            if line.get("error") or response.get("status_code") != 200:
+                error = line.get("error") or body.get("error") or "status %s" % response.get("status_code")
+            get_metrics().record_llm_call(name, body.get("model", "unknown"), now, now,
+                                          usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0),
+                                          error=json.dumps(error) if error else None)
+            if not error:
+                replies[line["custom_id"]] = body["choices"][0]["message"]["content"]
+
+    # Sections of every requested blob, by SHA, for every repository it is in
+    reviewed = {}
+    for full_name, repository in plan["repositories"].items():
+        for custom_id, file_paths in repository["requests"].items():
+            if custom_id not in replies:
+                print("No reply for %s, its files are reviewed again next time" % custom_id)
+                continue
+            for file_path, section in parse_file_sections(replies[custom_id], file_paths).items():
+                sha = repository["waiting"][file_path]["sha"]
+                reviewed[sha] = section
+                if file_reviews:
+                    file_reviews.share(plan["fingerprint"], sha, section)
+
+    release(plan, reviewed)
+
+    reports = []
+    for repo in repos_with_contents:
+        repository = plan["repositories"][repo["full_name"]]
+        sections = dict(repository["sections"])
+        for file_path, waiting in repository["waiting"].items():
+            if waiting["sha"] in reviewed:
+                sections[file_path] = relocate(reviewed[waiting["sha"]], file_path, waiting["sha"], waiting["findings"])
+
+        if file_reviews:
+            save_reviews(file_reviews, repo, plan["fingerprint"], sections,
+                         repository["triaged"], repository["unchanged"], repository["reviewed"])
+
+        report = render_repository_report(repo, sections)
+        write_file_to_disk(report, os.path.join(reports_dir, repo["name"] + ".md"))
+        if on_report:
+            on_report(repo, report)
+        reports.append(report)
+
+    return reports
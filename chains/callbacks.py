@@ -0,0 +1,70 @@
+import threading
+import time
+from typing import Any, Dict, List
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from util.metrics import get_metrics
+from util.tokens import count_tokens
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    Records the latency and token usage of every LLM call made by a chain or
+    agent in the run's metrics, under `name`.
+
+    Token counts come from the provider's usage data when it is returned,
+    otherwise they are estimated from the prompt and completion text.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[UUID, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: UUID, prompt: str, kwargs: Dict[str, Any]):
+        params = kwargs.get("invocation_params") or {}
+        with self._lock:
+            self._calls[run_id] = {
+                "start": time.perf_counter(),
+                "prompt": prompt,
+                "model": params.get("model_name") or params.get("model") or params.get("_type", "unknown"),
+            }
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID, **kwargs: Any):
+        self._start(run_id, "\n".join(str(m.content) for batch in messages for m in batch), kwargs)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any):
+        self._start(run_id, "\n".join(prompts), kwargs)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            call = self._calls.pop(run_id, None)
+        if call is None:
+            return
+
+        generation = response.generations[0][0] if response.generations and response.generations[0] else None
+        usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+
+        if usage:
+            prompt_tokens, completion_tokens, estimated = usage["input_tokens"], usage["output_tokens"], False
+        elif token_usage:
+            prompt_tokens, completion_tokens, estimated = token_usage["prompt_tokens"], token_usage["completion_tokens"], False
+        else:
+            text = generation.text if generation else ""
+            prompt_tokens, completion_tokens, estimated = count_tokens(call["prompt"]), count_tokens(text), True
+
+        get_metrics().record_llm_call(self.name, call["model"], call["start"], time.perf_counter(),
+                                      prompt_tokens, completion_tokens, estimated=estimated)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            call = self._calls.pop(run_id, None)
+        if call is None:
+            return
+
+        get_metrics().record_llm_call(self.name, call["model"], call["start"], time.perf_counter(),
+                                      count_tokens(call["prompt"]), 0, estimated=True, error=repr(error))
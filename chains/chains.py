@@ -2,18 +2,30 @@ import os
 import sys
 sys.path.append(os.getcwd())
 
+from functools import lru_cache
+
 from langchain.prompts import PromptTemplate
 from langchain_openai import ChatOpenAI
 from output_parsers import repository_summary_parser
 
 
+@lru_cache(maxsize=None)
+def get_llm(model_name: str):
+    """
+    Returns a shared chat model client, built once per model.
+    """
+    return ChatOpenAI(
+        temperature=0,
+        model_name=model_name,
+        # Report token usage when streaming too, for the run's metrics
+        stream_usage=True
+    )
+
 
+@lru_cache(maxsize=None)
 def get_repository_summary_chain():
 
-    llm = ChatOpenAI(
-        temperature=0,
-        model_name="gpt-4o"
-    )
+    llm = get_llm("gpt-4o")
 
     repository_summary_prompt = """
         - You are an expert infrastructure as code programmer, specializing in Terraform.
@@ -34,6 +46,9 @@ def get_repository_summary_chain():
         - Specifically reference the file name and line number where the issue was found.
         - The submission only have to meet the requirements of the style guide if they have impelmented that
           feature in the code.
+        - Some rules have already been checked by a linter: {prechecked_rules}. Do not check these rules again.
+          Include every one of the Pre-computed Findings below in the feedback for its file, using the exact
+          file name and line number given.
 
         Task 1: Generate a report.
         - Given the Terraform files in the repositories, I want you to generate a report.
@@ -55,6 +70,8 @@ def get_repository_summary_chain():
         Full Name: {full_name}
         Offical Terraform Style Guide: {terraform_style_guide}
         Terraform Files: {terraform_files}
+        Pre-computed Findings:
+        {precomputed_findings}
 
         Your report should be in the following format:
 
@@ -85,51 +102,106 @@ def get_repository_summary_chain():
         """
 
     repository_summary_template = PromptTemplate(
-        input_variables=["owner", "name", "full_name", "terraform_style_guide", "terraform_files"],
+        input_variables=["owner", "name", "full_name", "terraform_style_guide", "terraform_files",
+                         "prechecked_rules", "precomputed_findings"],
         template=repository_summary_prompt,
         partial_variables={"format_instructions": repository_summary_parser.get_format_instructions()
         },
     )
 
-    return repository_summary_template | llm 
+    # Named, so its calls are recorded under this name in the run's metrics
+    chain = repository_summary_template | llm
+    chain.name = "repository_summary"
+    return chain
 
 
-def get_user_summary_chain():
-    print("Generating User Summary Report")
+@lru_cache(maxsize=None)
+def get_repository_reduce_chain():
 
-    llm = ChatOpenAI(
-        temperature=0,
-        model_name="gpt-4o-mini"
-    )
+    llm = get_llm("gpt-4o")
 
-    repository_summary_prompt = """
+    repository_reduce_prompt = """
         - You are an expert infrastructure as code programmer, specializing in Terraform.
-        - Your job is to summerize the all of the provided reports.
-        - In your summary include a single sentance per report, including the name of the repository and the score.
-        - Your report should be in markdown format.
+        - The Terraform files in a repository were too large to review at once, so they were split
+          into batches and each batch was reviewed separately.
+        - Your job is to merge the batch reports below into a single report for the repository.
+        - Keep the feedback, scores and suggestions for every file exactly as they are in the batch reports.
+        - If a file appears in more than one batch report, merge its feedback into a single section and
+          use the average of its scores.
+        - The total score should be calculated as the sum of the scores for each Terraform file divided by the number of Terraform files.
+        - The report should be in Markdown format.
+
+        Owner: {owner}
+        Name: {name}
+        Full Name: {full_name}
+        Terraform Files: {terraform_files}
 
-        Repository Summary Quality Reports:
-        {repository_summary_reports}
+        Batch Reports:
+        {batch_reports}
 
         Your report should be in the following format:
-        # Engineer Summary Report
-        - **GitHub User:** {owner}
-        - **Repositories Analysed** 
-            - <LIST OF REPOSITORIES>
-
-        ### Summary
-        - **<REPOSITORY NAME>**
-            - **Summary:** <SUMMARY>
+
+        # IaC Repository Report
+        - **Owner:** {owner}
+        - **Repository:** {name}
+        - **Terraform Files:**
+            - `{terraform_files}`
+
+        ## Feedback
+        - ### <FILE NAME>
+            - **Feedback:**
+              - <FEEDBACK>
             - **Score:** <SCORE>
+            - **Suggestion:**
+                - Current implementation
+                  ```hcl
+                  <EXISTING CODE>
+                  ```
+                  Suggested implementation
+                  ```hcl
+                  <SUGGESTED CODE>
+                  ```
+
+        Total Score
+        - **Total Score:** <TOTAL SCORE>/10
 
-        **Total Score:** <TOTAL SCORE>/10
         """
 
-    repository_summary_template = PromptTemplate(
-        input_variables=["owner", "repository_summary_reports"],
-        template=repository_summary_prompt,
-        partial_variables={"format_instructions": repository_summary_parser.get_format_instructions()
-        },
+    repository_reduce_template = PromptTemplate(
+        input_variables=["owner", "name", "full_name", "terraform_files", "batch_reports"],
+        template=repository_reduce_prompt,
+    )
+
+    chain = repository_reduce_template | llm
+    chain.name = "repository_reduce"
+    return chain
+
+
+@lru_cache(maxsize=None)
+def get_user_summary_chain():
+
+    llm = get_llm("gpt-4o-mini")
+
+    user_summary_prompt = """
+        - You are an expert infrastructure as code programmer, specializing in Terraform.
+        - Your job is to summerize the quality of a GitHub user's Terraform repositories.
+        - Each repository below has its score out of 10 and the feedback for its lowest scoring files.
+        - Write a single sentance per repository, describing its strengths and the most important issues to fix.
+        - Do not include scores, they are added to the report separately.
+
+        GitHub User: {owner}
+        Repositories:
+        {repositories}
+
+        Your reply should be one line per repository, in the following format, and nothing else:
+        - **<REPOSITORY NAME>:** <SUMMARY>
+        """
+
+    user_summary_template = PromptTemplate(
+        input_variables=["owner", "repositories"],
+        template=user_summary_prompt,
     )
 
-    return repository_summary_template | llm 
\ No newline at end of file
+    chain = user_summary_template | llm
+    chain.name = "user_summary"
+    return chain
@@ -0,0 +1,356 @@
+import asyncio
+import os
+from typing import Callable, Dict, List, Optional
+
+from chains.callbacks import MetricsCallbackHandler
+from util.file_reviews import FileReviewStore, changed_files, file_shas, relocate
+from util.fs import write_file_to_disk
+from util.hcl import strip_noise
+from util.metrics import get_metrics
+from util.precheck import CHECKED_RULES, check_files, format_findings
+from util.report import parse_file_sections, render_repository_report
+from util.review_cache import ReviewCache
+from util.scheduler import LLMScheduler, DEFAULT_COMPLETION_TOKENS
+from util.style_guide import StyleGuide
+from util.tokens import count_tokens, pack_files
+from util.triage import Triage
+
+
+async def generate(chain,
+                   inputs: Dict,
+                   scheduler: LLMScheduler,
+                   review_cache: Optional[ReviewCache] = None,
+                   stream_to: Optional[str] = None,
+                   stream_stdout: bool = False) -> str:
+    """
+    Invokes `chain` within the scheduler's rate limits, reusing a cached
+    result when the rendered inputs have been seen before.
+
+    With `stream_to`, tokens are appended to that file as they arrive (and
+    echoed to stdout with `stream_stdout`), so a partial report survives an
+    interruption.
+    """
+    if review_cache:
+        cache_key = ReviewCache.key(chain, inputs)
+        cached = review_cache.get(cache_key)
+        if cached is not None:
+            if stream_to:
+                write_file_to_disk(cached, stream_to)
+            return cached
+
+    config = {"callbacks": [MetricsCallbackHandler(chain.get_name())]}
+
+    async def call() -> str:
+        if not stream_to:
+            message = await chain.ainvoke(input=inputs, config=config)
+            return message.content
+
+        return await stream_to_file(chain.astream(input=inputs, config=config), stream_to, stream_stdout)
+
+    prompt = chain.first.format(**inputs)
+    content = await scheduler.run(
+        call,
+        estimated_tokens=count_tokens(prompt) + DEFAULT_COMPLETION_TOKENS,
+    )
+
+    if review_cache:
+        review_cache.put(cache_key, content)
+    return content
+
+
+async def stream_to_file(chunks, path: str, stdout: bool = False) -> str:
+    """
+    Writes streamed message chunks to `path` as they arrive, returning the full content.
+    """
+    content = []
+    with open(path, "w") as file:
+        async for chunk in chunks:
+            file.write(chunk.content)
+            file.flush()
+            if stdout:
+                print(chunk.content, end="", flush=True)
+            content.append(chunk.content)
+
+    if stdout:
+        print()
+    return "".join(content)
+
+
+def findings_for_batch(findings: List[Dict], batch: List[Dict]) -> List[Dict]:
+    """
+    Returns the findings that fall inside the files, or the line ranges of
+    split files, in `batch`.
+    """
+    selected = []
+    for f in findings:
+        for part in batch:
+            if part["file_path"] != f["file_path"]:
+                continue
+            if "lines" in part:
+                first, last = (int(n) for n in part["lines"].split("-"))
+                if not first <= f["line"] <= last:
+                    continue
+            selected.append(f)
+            break
+    return selected
+
+
+def review_fingerprint(repository_summary_chain, style_guide: StyleGuide, precheck: bool) -> str:
+    """
+    Returns the key stored file reviews are valid for: they only apply while
+    the prompt, model and review settings are unchanged.
+    """
+    return ReviewCache.key(repository_summary_chain, {
+        "style_guide": style_guide.text,
+        "style_guide_mode": style_guide.mode,
+        "precheck": precheck,
+    })
+
+
+def select_files(repo: Dict,
+                 shas: Dict[str, str],
+                 findings: List[Dict],
+                 fingerprint: Optional[str] = None,
+                 file_reviews: Optional[FileReviewStore] = None,
+                 triage: Optional[Triage] = None) -> Dict:
+    """
+    Works out where the review of each file of `repo` comes from, in order:
+
+    - unreviewed: its content is empty, e.g. it could not be fetched, so it is left out
+    - stored: the file is unchanged since its last review in this repository
+    - shared: its blob was already reviewed in another repository, or at another path
+    - triaged: triage is confident about it, so it is scored locally
+    - waiting: another repository of this run is reviewing its blob
+    - owned: every other file, which is reviewed by the LLM
+
+    Returns `{"sections", "unchanged", "triaged", "waiting", "owned"}`, where
+    `sections` holds the stored, shared and triaged sections by path. The
+    blobs of owned files are claimed in `file_reviews`, so they must be
+    released once reviewed.
+    """
+    stored = file_reviews.load(repo["full_name"], fingerprint) if file_reviews else {}
+    to_review = changed_files(repo["files"], stored, shas)
+    pending = {f["file_path"] for f in to_review}
+    sections = {p: stored[p] for p in shas if p in stored and p not in pending}
+    if sections:
+        print("Reusing reviews of %s unchanged files for %s" % (len(sections), repo["full_name"]))
+
+    selection = {"sections": sections, "unchanged": len(sections), "triaged": [], "waiting": {}, "owned": []}
+    for f in to_review:
+        file_path, sha = f["file_path"], shas[f["file_path"]]
+        file_findings = [x for x in findings if x["file_path"] == file_path]
+
+        if not f["content"].strip():
+            print("No content for %s/%s, it is not reviewed" % (repo["full_name"], file_path))
+            continue
+
+        if file_reviews:
+            shared = file_reviews.lookup(fingerprint, sha)
+            if shared is not None:
+                sections[file_path] = relocate(shared, file_path, sha, file_findings)
+                file_reviews.count(shared=1)
+                continue
+
+        if triage:
+            section = triage.review(file_path, f["content"])
+            if section is not None:
+                sections[file_path] = relocate(section, file_path, sha, file_findings)
+                selection["triaged"].append(file_path)
+                continue
+
+        in_flight = file_reviews.claim(fingerprint, sha) if file_reviews else None
+        if in_flight is not None:
+            selection["waiting"][file_path] = in_flight
+        else:
+            selection["owned"].append(f)
+
+    if triage:
+        print("Triage of %s: %s files scored locally, %s sent to full review" % (
+            repo["full_name"], len(selection["triaged"]), len(selection["owned"]) + len(selection["waiting"])))
+    return selection
+
+
+def save_reviews(file_reviews: FileReviewStore,
+                 repo: Dict,
+                 fingerprint: str,
+                 sections: Dict[str, Dict],
+                 triaged: List[str],
+                 unchanged: int,
+                 reviewed: int):
+    """
+    Stores the sections of a reviewed repository and counts its files as
+    reused or reviewed.
+
+    Files without a section, e.g. missing from the LLM's reply, are not
+    stored, so they are reviewed again next time. Triaged files are not
+    stored either, triage is cheap and a later full review supersedes it.
+    """
+    file_reviews.save(repo["full_name"], fingerprint,
+                      {p: s for p, s in sections.items() if p not in triaged})
+    file_reviews.count(reused=unchanged, reviewed=reviewed)
+
+
+async def review_repository(repo: Dict,
+                            repository_summary_chain,
+                            repository_reduce_chain,
+                            style_guide: StyleGuide,
+                            scheduler: LLMScheduler,
+                            review_cache: Optional[ReviewCache] = None,
+                            batch_tokens: int = 12000,
+                            precheck: bool = True,
+                            stream: bool = False,
+                            stream_stdout: bool = False,
+                            file_reviews: Optional[FileReviewStore] = None,
+                            triage: Optional[Triage] = None,
+                            reports_dir: str = "reports") -> str:
+    """
+    Generates the report for a single repository and writes it to
+    <reports_dir>/<name>.md as soon as it is ready.
+
+    Only the style guide rules that apply to the repository's files are
+    sent, unless the style guide is in "full" mode.
+
+    License headers and commented out code are stripped, then the files
+    are packed into batches of at most `batch_tokens` tokens. Batches are
+    reviewed in parallel and their reports merged by `repository_reduce_chain`.
+
+    With `precheck`, mechanical rules are checked locally first and their
+    findings are passed to the LLM as facts, in place of the rules' text.
+
+    With `stream`, the final report is written to disk token by token. When
+    the report is assembled from file sections, the LLM's reply is streamed
+    to the report path instead, then replaced by the assembled report.
+
+    With `file_reviews`, only files whose blob SHA changed since their last
+    review are sent to the LLM. The report is assembled from the feedback
+    section of each file, new and stored, instead of being merged by
+    `repository_reduce_chain`.
+
+    With `triage`, changed files are first checked locally and only the
+    files it escalates are sent to the LLM, see `Triage`. The report is
+    assembled from the sections of both tiers.
+    """
+    report_path = os.path.join(reports_dir, repo["name"] + ".md")
+
+    findings = check_files(repo["files"]) if precheck else []
+    prechecked_rules = CHECKED_RULES if precheck else []
+
+    shas = file_shas(repo)
+    fingerprint = review_fingerprint(repository_summary_chain, style_guide, precheck) if file_reviews else None
+    selection = select_files(repo, shas, findings, fingerprint, file_reviews, triage)
+    to_review = selection["owned"]
+
+    def entry(file_path: str, section: Dict) -> Dict:
+        return relocate(section, file_path, shas[file_path], [f for f in findings if f["file_path"] == file_path])
+
+    assemble = file_reviews is not None or triage is not None
+
+    async def review_batch(i: int, batch: List[Dict], count: int) -> str:
+        if count > 1:
+            print("Generating report for %s (batch %s/%s)" % (repo["full_name"], i + 1, count))
+        else:
+            print("Generating report for " + repo["full_name"])
+
+        return await generate(repository_summary_chain, {
+            "owner": repo["owner"],
+            "name": repo["name"],
+            "full_name": repo["full_name"],
+            "terraform_style_guide": style_guide.for_files(batch, exclude=prechecked_rules),
+            "terraform_files": batch,
+            "prechecked_rules": ", ".join(prechecked_rules) or "None",
+            "precomputed_findings": format_findings(findings_for_batch(findings, batch)),
+        }, scheduler, review_cache,
+            stream_to=report_path if stream and count == 1 else None,
+            stream_stdout=stream_stdout)
+
+    async def review_files(review: List[Dict]) -> List[str]:
+        files = [{"file_path": f["file_path"], "content": strip_noise(f["content"])} for f in review]
+        batches = pack_files(files, batch_tokens)
+        if not batches and not assemble:
+            batches = [[]]
+        return await asyncio.gather(*[review_batch(i, b, len(batches)) for i, b in enumerate(batches)])
+
+    if assemble:
+        sections = dict(selection["sections"])
+        try:
+            parsed = parse_file_sections("\n\n".join(await review_files(to_review)), [f["file_path"] for f in to_review])
+            sections.update({p: entry(p, section) for p, section in parsed.items()})
+        finally:
+            # Repositories waiting for these blobs review them themselves if a section is missing
+            if file_reviews:
+                for f in to_review:
+                    file_reviews.release(fingerprint, shas[f["file_path"]], sections.get(f["file_path"]))
+
+        missing = []
+        for file_path, in_flight in selection["waiting"].items():
+            shared = await asyncio.wrap_future(in_flight)
+            if shared is None:
+                missing.append(next(f for f in repo["files"] if f["file_path"] == file_path))
+            else:
+                sections[file_path] = entry(file_path, shared)
+                file_reviews.count(shared=1)
+
+        if missing:
+            parsed = parse_file_sections("\n\n".join(await review_files(missing)), [f["file_path"] for f in missing])
+            for file_path, section in parsed.items():
+                sections[file_path] = entry(file_path, section)
+                file_reviews.share(fingerprint, shas[file_path], sections[file_path])
+
+        if file_reviews:
+            save_reviews(file_reviews, repo, fingerprint, sections, selection["triaged"], selection["unchanged"],
+                         len(to_review) + len(missing))
+
+        repository_summary = render_repository_report(repo, sections)
+        write_file_to_disk(repository_summary, report_path)
+        return repository_summary
+
+    batch_reports = await review_files(to_review)
+
+    if len(batch_reports) == 1:
+        repository_summary = batch_reports[0]
+    else:
+        print("Merging %s batch reports for %s" % (len(batch_reports), repo["full_name"]))
+        repository_summary = await generate(repository_reduce_chain, {
+            "owner": repo["owner"],
+            "name": repo["name"],
+            "full_name": repo["full_name"],
+            "terraform_files": [f["file_path"] for f in repo["files"]],
+            "batch_reports": "\n\n".join(batch_reports)
+        }, scheduler, review_cache,
+            stream_to=report_path if stream else None,
+            stream_stdout=stream_stdout)
+
+    if not stream:
+        write_file_to_disk(repository_summary, report_path)
+    return repository_summary
+
+
+async def review_repositories(repos_with_contents: List[Dict],
+                              repository_summary_chain,
+                              repository_reduce_chain,
+                              style_guide: StyleGuide,
+                              scheduler: LLMScheduler,
+                              review_cache: Optional[ReviewCache] = None,
+                              batch_tokens: int = 12000,
+                              precheck: bool = True,
+                              stream: bool = False,
+                              stream_stdout: bool = False,
+                              file_reviews: Optional[FileReviewStore] = None,
+                              triage: Optional[Triage] = None,
+                              reports_dir: str = "reports",
+                              on_report: Optional[Callable[[Dict, str], None]] = None) -> List[str]:
+    """
+    Reviews every repository concurrently, returning reports in the same
+    order as `repos_with_contents`.
+    `on_report` is called with each repository and its report as soon as it is ready.
+    """
+    async def review(r: Dict) -> str:
+        with get_metrics().span("review", category="repository", full_name=r["full_name"]):
+            report = await review_repository(r, repository_summary_chain, repository_reduce_chain, style_guide,
+                                             scheduler, review_cache, batch_tokens, precheck, stream, stream_stdout,
+                                             file_reviews, triage, reports_dir)
+        if on_report:
+            on_report(r, report)
+        return report
+
+    return await asyncio.gather(*[review(r) for r in repos_with_contents])
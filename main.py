@@ -1,73 +1,532 @@
-from agents.github_username import get as get_github_username
-from chains.chains import get_repository_summary_chain, get_user_summary_chain
 import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+from typing import Dict
 
-from util.fs import write_file_to_disk, load_file_as_string
-from util.util import get_hcl_repositories, find_hcl_files_in_repos, get_tf_file_contents_from_repos
 from util.config import Config
+from util.rate_limit import GitHubError
 
-def create_report(query: str, config: Config):
+def _review_options(config: Config, state, reports_dir: str) -> Dict:
+  """
+  Returns the keyword arguments of `review_repository` for a run.
+  """
+  from chains.chains import get_repository_summary_chain, get_repository_reduce_chain
+  from util.style_guide import load_style_guide
 
-  # Search for Github Username from name
-  github_username = get_github_username(query, debug=config.get('debug'))
+  # Read Style Guide from disk, indexed by rule
+  style_guide = load_style_guide("static/hcl_style_guide.md", mode=config.get('style_guide_mode'))
 
-  # Find Github users repositories that contain HCL code, sorted by updated_at
-  repos = get_hcl_repositories(
-     username=github_username.username, 
-     max_repos=config.get('max_repos')
+  return dict(
+     repository_summary_chain=get_repository_summary_chain(),
+     repository_reduce_chain=get_repository_reduce_chain(),
+     style_guide=style_guide,
+     scheduler=state.scheduler,
+     review_cache=state.review_cache,
+     batch_tokens=config.get('review_batch_tokens'),
+     precheck=config.get('precheck'),
+     stream=config.get('stream'),
+     stream_stdout=config.get('stream_stdout'),
+     file_reviews=state.file_reviews,
+     triage=state.triage if config.get('triage') else None,
+     reports_dir=reports_dir
   )
 
-  # Returns a list of files in each repo that contain Terraform files (.tf)
-  repos_with_filenames = find_hcl_files_in_repos(
-     repos=repos,
-     max_files_per_repo=config.get('max_files_per_repo'),
-     max_depth_per_repo=config.get('max_depth_per_repo')
+
+def _review_in_batch(repos_with_contents, config: Config, state, run, reports_dir: str, on_report=None):
+  """
+  Reviews every repository with a single batch request, see `review_in_batch`.
+  """
+  from chains.batch import get_batch_backend, review_in_batch
+
+  options = _review_options(config, state, reports_dir)
+  return review_in_batch(
+     repos_with_contents,
+     backend=get_batch_backend(config.get('batch_backend'), directory=config.get('batch_dir')),
+     run=run,
+     repository_summary_chain=options['repository_summary_chain'],
+     style_guide=options['style_guide'],
+     batch_tokens=options['batch_tokens'],
+     precheck=options['precheck'],
+     file_reviews=options['file_reviews'],
+     triage=options['triage'],
+     reports_dir=reports_dir,
+     poll_seconds=config.get('batch_poll_seconds'),
+     on_report=on_report
   )
 
-  # Returns content of each .tf file
-  repos_with_contents = get_tf_file_contents_from_repos(repos_with_filenames, max=5)
-
-  # Read Style Guide from disk
-  hcl_style_guide = load_file_as_string("static/hcl_style_guide.md")
-  
-  # Generate Repository Summary Reports for every repository
-  reports = []
-  repository_summary_chain = get_repository_summary_chain()
-
-  for r in repos_with_contents:
-    print("Generating report for " + r["full_name"])
-    repository_summary = repository_summary_chain.invoke(
-        input={
-            "owner": r["owner"],
-            "name": r["name"],
-            "full_name": r["full_name"],
-            "terraform_style_guide": hcl_style_guide,
-            "terraform_files": r["files"]
-        }
-    )
-    write_file_to_disk(repository_summary.content, "reports/" + r["name"] + ".md")
-    reports.append(repository_summary.content)
+
+def create_report(query: str, config: Config, state=None):
+  """
+  Writes a report for every HCL repository of the engineer described by
+  `query`, and the engineer summary, to the `reports_dir` directory.
+
+  `state` holds the GitHub client and caches to use, so a long running
+  process can share them between reports. By default they are built from
+  `config`. Returns the engineer summary as a `Report`.
+  """
+
+  # Heavy dependencies (langchain, openai, requests) are imported here rather
+  # than at module load, so `--help` and argument errors return immediately
+  from agents.github_username import get as get_github_username
+  from chains.chains import get_user_summary_chain
+  from chains.review import review_repositories, review_repository
+  from util.fs import write_file_to_disk
+  from util.report import compact_summary, parse_summary_sentences, render_user_summary, summarize_repository
+  from util.util import Repository, get_hcl_repositories, find_hcl_files_in_repo, find_hcl_files_in_repos
+  from util.util import get_tf_file_contents_from_repo, get_tf_file_contents_from_repos
+  from util.pipeline import Stage, run_pipeline
+  from util.checkpoint import RunStore
+  from util.metrics import reset_metrics
+  from chains.callbacks import MetricsCallbackHandler
+  from util.state import SharedState
+
+  # Time every stage, GitHub request and LLM call of this run
+  metrics = reset_metrics()
+
+  # GitHub client, response, username and review caches
+  if state is None:
+    state = SharedState(config)
+  github = state.github
+  review_cache = state.review_cache
+  file_reviews = state.file_reviews
+
+  reports_dir = config.get('reports_dir')
+  os.makedirs(reports_dir, exist_ok=True)
+
+  # Persist the output of every stage, so an interrupted run can be resumed
+  run = RunStore(config.get('run_dir'), query, config.to_dict(), resume=config.get('resume'))
+  print("Run directory: " + run.path)
+
+  # Search for Github Username from name
+  with metrics.span("username"):
+    username = run.stage("username", lambda: [
+       get_github_username(query, debug=config.get('debug'), cache=state.username_cache).to_dict()
+    ])[0]["username"]
+
+  # Find Github users repositories that are mostly HCL code, most recently pushed first
+  with metrics.span("repos"):
+    repos = [Repository(**r) for r in run.stage("repos", lambda: [r.to_dict() for r in get_hcl_repositories(
+       username=username,
+       max_repos=config.get('max_repos'),
+       sort=config.get('repo_sort')
+    )])]
+
+  review_options = _review_options(config, state, reports_dir)
+
+  # Skip repositories that were already reviewed by an interrupted run
+  reviewed = {}
+  if config.get('resume'):
+    reviewed = {r["full_name"]: r for r in run.load("reviews") or []}
+    for r in repos:
+      if r.full_name in reviewed:
+        print("Resuming with existing report for " + r.full_name)
+        write_file_to_disk(reviewed[r.full_name]["report"], os.path.join(reports_dir, r.name + ".md"))
+
+  def save_review(r, report):
+    reviewed[r["full_name"]] = {"full_name": r["full_name"], "files": [f["file_path"] for f in r["files"]], "report": report}
+    run.append("reviews", reviewed[r["full_name"]])
+
+  if config.get('pipeline') and not config.get('batch'):
+    # Each repository is discovered, downloaded, reviewed and written on its own, so
+    # early repositories are reviewed while later ones are still downloading. Only
+    # `pipeline_buffer` repositories wait between stages, which bounds the file
+    # contents held in memory.
+    def discover(r):
+      with metrics.span("filenames", category="repository", full_name=r.full_name):
+        return find_hcl_files_in_repo(r,
+           max_files_per_repo=config.get('max_files_per_repo'),
+           max_depth_per_repo=config.get('max_depth_per_repo'),
+           discovery_mode=config.get('discovery_mode'))
+
+    def fetch(r):
+      with metrics.span("contents", category="repository", full_name=r["full_name"]):
+        return get_tf_file_contents_from_repo(r,
+           max=config.get('max_files_per_repo'),
+           fetch_mode=config.get('fetch_mode'),
+           blobs=state.blobs)
+
+    async def review(r):
+      with metrics.span("review", category="repository", full_name=r["full_name"]):
+        report = await review_repository(r, **review_options)
+      save_review(r, report)
+      return r["full_name"]
+
+    # Files of each repository are already downloaded in parallel, so 2 repositories
+    # at a time keep the GitHub client busy
+    with metrics.span("pipeline"):
+      asyncio.run(run_pipeline([r for r in repos if r.full_name not in reviewed], [
+         Stage("filenames", discover, workers=2, blocking=True),
+         Stage("contents", fetch, workers=2, blocking=True),
+         Stage("reviews", review, workers=config.get('llm_concurrency')),
+      ], buffer=config.get('pipeline_buffer')))
+
+  else:
+    # Returns a list of files in each repo that contain Terraform files (.tf)
+    with metrics.span("filenames"):
+      repos_with_filenames = run.stage("filenames", lambda: find_hcl_files_in_repos(
+         repos=repos,
+         max_files_per_repo=config.get('max_files_per_repo'),
+         max_depth_per_repo=config.get('max_depth_per_repo'),
+         discovery_mode=config.get('discovery_mode')
+      ))
+
+    # Returns content of each .tf file
+    with metrics.span("contents"):
+      repos_with_contents = run.stage("contents", lambda: get_tf_file_contents_from_repos(
+         repos_with_filenames,
+         max=config.get('max_files_per_repo'),
+         fetch_mode=config.get('fetch_mode'),
+         blobs=state.blobs
+      ))
+
+    with metrics.span("reviews"):
+      if config.get('batch'):
+        # One batch request for every repository, resumed by `--resume` until it is finished
+        _review_in_batch([r for r in repos_with_contents if r["full_name"] not in reviewed],
+                         config, state, run, reports_dir, on_report=save_review)
+      else:
+        asyncio.run(review_repositories(
+           [r for r in repos_with_contents if r["full_name"] not in reviewed],
+           **review_options,
+           on_report=save_review
+        ))
+
+  # Scores and top findings of every repository, parsed from its report
+  summaries = [summarize_repository({
+     "owner": r.owner,
+     "name": r.name,
+     "full_name": r.full_name,
+     "files": [{"file_path": p} for p in reviewed[r.full_name].get("files", [])],
+  }, reviewed[r.full_name]["report"]) for r in repos]
+  write_file_to_disk(json.dumps([s.to_dict() for s in summaries], indent=2), os.path.join(reports_dir, "engineer-summary.json"))
 
   # Generate User Summary Report
-  user_summary_chain = get_user_summary_chain()
-  user_summary = user_summary_chain.invoke(
-      input={
-          "owner": github_username.username,
-          "repository_summary_reports": reports
-      }
-  )
-  write_file_to_disk(user_summary.content, "reports/engineer-summary.md")
-  
+  # Scores and the total are computed here, the LLM only writes a sentence per repository
+  print("Generating User Summary Report")
+  sentences = {}
+  with metrics.span("user_summary"):
+    if config.get('summary_llm') and summaries:
+      user_summary_chain = get_user_summary_chain()
+      user_summary = user_summary_chain.invoke(input={
+         "owner": username,
+         "repositories": "\n".join(compact_summary(s) for s in summaries)
+      }, config={"callbacks": [MetricsCallbackHandler(user_summary_chain.get_name())]})
+      sentences = parse_summary_sentences(user_summary.content, [s.name for s in summaries])
+    user_summary_report = render_user_summary(username, summaries, sentences)
+    write_file_to_disk(user_summary_report.report, os.path.join(reports_dir, "engineer-summary.md"))
+    if config.get('stream_stdout'):
+      print(user_summary_report.report)
+
+  if github.cache:
+    stats = github.cache.stats()
+    print("GitHub response cache: %s hits, %s misses" % (stats["hits"], stats["misses"]))
+
+  if review_cache:
+    stats = review_cache.stats()
+    print("Repository report cache: %s hits, %s misses" % (stats["hits"], stats["misses"]))
+
+  if state.blobs:
+    stats = state.blobs.stats()
+    print("File contents: %s downloaded, %s reused" % (stats["downloads"], stats["hits"]))
+
+  if file_reviews:
+    stats = file_reviews.stats()
+    print("File reviews: %s reused, %s shared, %s reviewed" % (stats["reused"], stats["shared"], stats["reviewed"]))
+
+  if state.triage:
+    stats = state.triage.stats()
+    print("Triage: %s files scored locally, %s sent to full review" % (stats["triaged"], stats["escalated"]))
+
+  # Write the metrics summary next to the run's checkpoints, unless told otherwise
+  summary = metrics.summary()
+  metrics_file = config.get('metrics_file') or os.path.join(run.path, "metrics.json")
+  metrics.write_summary(metrics_file)
+  if config.get('trace_file'):
+    metrics.write_trace(config.get('trace_file'))
+
+  print("Stages: " + ", ".join("%s %.1fs" % (name, seconds) for name, seconds in summary["stages"].items()))
+  print("GitHub: %s requests, %s not modified, %s errors, %s retries" % (
+     summary["github"]["requests"], summary["github"]["not_modified"], summary["github"]["errors"],
+     summary["github"]["retries"]))
+  for resource, limit in summary["github"]["rate_limit"].items():
+    print("GitHub rate limit (%s): %s/%s remaining, lowest %s" % (
+       resource, limit["remaining"], limit["limit"], limit["min_remaining"]))
+  print("LLM: %s calls, %s prompt tokens, %s completion tokens" % (
+     summary["llm"]["calls"], summary["llm"]["prompt_tokens"], summary["llm"]["completion_tokens"]))
+  print("Metrics written to " + metrics_file)
+
+  return user_summary_report
+
+
+
+def create_org_report(org: str, config: Config):
+  """
+  Reviews every HCL repository of a GitHub organization, then writes a
+  leaderboard of them to the `reports_dir`/<org> directory.
+
+  Repositories are queued in a durable work queue in `org_queue_dir`,
+  which is drained by `org_workers` processes. Processes on other machines
+  sharing the directory can help drain it with `org_worker`, which skips
+  listing repositories and writing the leaderboard.
+
+  With `batch`, every repository is reviewed in a single batch request by
+  this process instead, see `review_org_in_batch`.
+  """
+  import multiprocessing
+  from output_parsers import RepositorySummary
+  from util.github import configure_client
+  from util.metrics import reset_metrics
+  from util.util import get_hcl_repositories
+  from util.work_queue import WorkQueue
+
+  metrics = reset_metrics()
+  reports_dir = os.path.join(config.get('reports_dir'), org)
+  os.makedirs(reports_dir, exist_ok=True)
+
+  if config.get('batch'):
+    return _write_org_leaderboard(org, review_org_in_batch(org, config, reports_dir), [], reports_dir)
+
+  queue = WorkQueue(os.path.join(config.get('org_queue_dir'), org), lease_seconds=config.get('org_lease_seconds'))
+  print("Work queue: " + queue.path)
+
+  if not config.get('org_worker'):
+    # Continue the queue of an interrupted run, or start again
+    if not config.get('resume'):
+      queue.clear()
+
+    # No response cache: its SQLite file would be shared with the worker processes
+    configure_client(max_concurrency=config.get('github_concurrency'), max_retries=config.get('github_max_retries'))
+    with metrics.span("repos"):
+      repos = get_hcl_repositories(
+         username=org,
+         max_repos=config.get('org_max_repos'),
+         sort=config.get('repo_sort'),
+         owner_type="org"
+      )
+    queued = sum(queue.put(r.full_name.replace("/", "__"), r.to_dict()) for r in repos)
+    print("Queued %s of %s repositories" % (queued, len(repos)))
+
+  # Each process gets an equal share of the LLM budgets
+  workers = config.get('org_workers')
+  settings = config.to_dict()
+  # SQLite is not safe to share between processes on other machines over a
+  # network filesystem, or across a fork, so workers do not cache responses.
+  # File contents are still reused through the blob store.
+  settings['http_cache'] = False
+  settings['llm_requests_per_minute'] = max(1, config.get('llm_requests_per_minute') // workers)
+  settings['llm_tokens_per_minute'] = max(1, config.get('llm_tokens_per_minute') // workers)
+
+  with metrics.span("reviews"):
+    while True:
+      # Workers are only started when there is work, including repositories
+      # whose lease expired on a worker elsewhere, as each one builds its state first
+      queue.requeue_expired()
+      if queue.counts()["pending"]:
+        if workers > 1:
+          processes = [multiprocessing.Process(target=work_org_queue, args=(org, settings)) for _ in range(workers)]
+          for p in processes:
+            p.start()
+          for p in processes:
+            p.join()
+        else:
+          work_org_queue(org, settings)
+
+      # Wait for repositories that workers elsewhere are still reviewing, taking
+      # them over if their lease expires
+      counts = queue.counts()
+      if config.get('org_worker') or not (counts["pending"] or counts["claimed"]):
+        break
+      if not counts["pending"]:
+        print("Waiting for %s repositories being reviewed by other workers" % counts["claimed"])
+        time.sleep(5)
+
+  counts = queue.counts()
+  print("Work queue: %s done, %s failed" % (counts["done"], counts["failed"]))
+  if config.get('org_worker'):
+    return None
+
+  summaries = [RepositorySummary(**{k: v for k, v in item["result"].items() if k != "worker"})
+               for item in queue.items("done")]
+  return _write_org_leaderboard(org, summaries, queue.items("failed"), reports_dir)
+
+
+def _write_org_leaderboard(org: str, summaries, failed, reports_dir: str):
+  from util.fs import write_file_to_disk
+  from util.metrics import get_metrics
+  from util.report import render_org_leaderboard
+
+  leaderboard = render_org_leaderboard(org, summaries, failed)
+  write_file_to_disk(leaderboard.report, os.path.join(reports_dir, "leaderboard.md"))
+  write_file_to_disk(json.dumps([s.to_dict() for s in summaries], indent=2), os.path.join(reports_dir, "leaderboard.json"))
+  print("Leaderboard written to " + os.path.join(reports_dir, "leaderboard.md"))
+
+  summary = get_metrics().summary()
+  print("Stages: " + ", ".join("%s %.1fs" % (name, seconds) for name, seconds in summary["stages"].items()))
+  return leaderboard
+
+
+def review_org_in_batch(org: str, config: Config, reports_dir: str):
+  """
+  Discovers and downloads every HCL repository of an organization, then
+  reviews them all in a single batch request, for bulk runs that do not
+  need results quickly. Returns the summary of each repository.
+
+  Every stage and the batch ID are checkpointed, so an interrupted run
+  resumed with `--resume` waits for the same batch.
+  """
+  from util.checkpoint import RunStore
+  from util.metrics import get_metrics
+  from util.report import summarize_repository
+  from util.state import SharedState
+  from util.util import Repository, get_hcl_repositories, find_hcl_files_in_repos, get_tf_file_contents_from_repos
+
+  metrics = get_metrics()
+  state = SharedState(config)
+  run = RunStore(config.get('run_dir'), "org:" + org, config.to_dict(), resume=config.get('resume'))
+  print("Run directory: " + run.path)
+
+  with metrics.span("repos"):
+    repos = [Repository(**r) for r in run.stage("repos", lambda: [r.to_dict() for r in get_hcl_repositories(
+       username=org,
+       max_repos=config.get('org_max_repos'),
+       sort=config.get('repo_sort'),
+       owner_type="org"
+    )])]
+
+  with metrics.span("filenames"):
+    repos_with_filenames = run.stage("filenames", lambda: find_hcl_files_in_repos(
+       repos=repos,
+       max_files_per_repo=config.get('max_files_per_repo'),
+       max_depth_per_repo=config.get('max_depth_per_repo'),
+       discovery_mode=config.get('discovery_mode')
+    ))
+
+  with metrics.span("contents"):
+    repos_with_contents = run.stage("contents", lambda: get_tf_file_contents_from_repos(
+       repos_with_filenames,
+       max=config.get('max_files_per_repo'),
+       fetch_mode=config.get('fetch_mode'),
+       blobs=state.blobs
+    ))
+
+  with metrics.span("reviews"):
+    reports = _review_in_batch(repos_with_contents, config, state, run, reports_dir)
+  return [summarize_repository(r, report) for r, report in zip(repos_with_contents, reports)]
+
+
+def work_org_queue(org: str, settings: Dict):
+  """
+  Reviews repositories from an organization's work queue, one at a time,
+  until none are pending. Each repository's report is written to the
+  `reports_dir`/<org> directory, and its scores are stored in the queue.
+  """
+  from chains.review import review_repository
+  from util.metrics import reset_metrics
+  from util.report import summarize_repository
+  from util.state import SharedState
+  from util.util import Repository, find_hcl_files_in_repo, get_tf_file_contents_from_repo
+  from util.work_queue import WorkQueue
+
+  config = Config()
+  for key, value in settings.items():
+    config.set(key, value)
+
+  metrics = reset_metrics()
+  state = SharedState(config)
+  queue = WorkQueue(os.path.join(config.get('org_queue_dir'), org), lease_seconds=config.get('org_lease_seconds'))
+  worker = "%s-%s" % (socket.gethostname(), os.getpid())
+
+  reports_dir = os.path.join(config.get('reports_dir'), org)
+  os.makedirs(reports_dir, exist_ok=True)
+  review_options = _review_options(config, state, reports_dir)
+
+  async def keep_alive(item_id: str):
+    while True:
+      await asyncio.sleep(queue.lease_seconds / 3)
+      queue.heartbeat(item_id)
+
+  async def drain() -> int:
+    reviewed = 0
+    while True:
+      claimed = queue.claim()
+      if claimed is None:
+        return reviewed
+
+      item_id, payload = claimed
+      r = Repository(**payload)
+      heartbeat = asyncio.ensure_future(keep_alive(item_id))
+      try:
+        with metrics.span("review", category="repository", full_name=r.full_name):
+          repo = await asyncio.to_thread(find_hcl_files_in_repo, r,
+             max_files_per_repo=config.get('max_files_per_repo'),
+             max_depth_per_repo=config.get('max_depth_per_repo'),
+             discovery_mode=config.get('discovery_mode'))
+          repo = await asyncio.to_thread(get_tf_file_contents_from_repo, repo,
+             max=config.get('max_files_per_repo'),
+             fetch_mode=config.get('fetch_mode'),
+             blobs=state.blobs)
+          report = await review_repository(repo, **review_options)
+        queue.complete(item_id, dict(summarize_repository(repo, report).to_dict(), worker=worker))
+        reviewed += 1
+      except Exception as e:
+        print("Failed to review %s: %s" % (r.full_name, e))
+        queue.fail(item_id, "%s: %s" % (type(e).__name__, e))
+      finally:
+        heartbeat.cancel()
+
+  reviewed = asyncio.run(drain())
+  print("Worker %s reviewed %s repositories" % (worker, reviewed))
+  metrics.write_summary(os.path.join(queue.path, "metrics", worker + ".json"))
 
 if __name__ == '__main__':
 
     # Parse args
     parser = argparse.ArgumentParser(description='Generate a report for a Github user')
-    parser.add_argument('--search', type=str, help='Query to search for', required=True)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--search', type=str, help='Query to search for')
+    target.add_argument('--org', type=str, help='GitHub organization to review every HCL repository of')
     parser.add_argument('--debug', action='store_true', help='Enable debug mode')
     parser.add_argument('--max-repos', type=int, help='Maximum number of repositories to search')
+    parser.add_argument('--org-max-repos', type=int, help='Maximum number of repositories to review with --org')
+    parser.add_argument('--org-workers', type=int, help='Number of worker processes reviewing repositories with --org')
+    parser.add_argument('--org-worker', action='store_true', help='With --org, only help review the repositories queued by another run')
+    parser.add_argument('--batch', action='store_true', help='Review every repository in a single batch request, for bulk runs that do not need results quickly')
+    parser.add_argument('--batch-backend', choices=['openai', 'local'], help='Where batch requests are sent, local processes them with the configured chat models')
+    parser.add_argument('--batch-poll-seconds', type=int, help='Seconds between checks of a submitted batch')
+    parser.add_argument('--repo-sort', choices=['pushed', 'updated'], help='Which repositories are the most recent')
     parser.add_argument('--max-files-per-repo', type=int, help='Maximum number of files to search per repository')
     parser.add_argument('--max-depth-per-repo', type=int, help='Maximum depth to search per repository')
+    parser.add_argument('--github-concurrency', type=int, help='Maximum number of concurrent GitHub API requests')
+    parser.add_argument('--github-max-retries', type=int, help='Retries for rate limited or failed GitHub requests before giving up')
+    parser.add_argument('--discovery-mode', choices=['tree', 'contents'], help='How to find .tf files in each repository')
+    parser.add_argument('--fetch-mode', choices=['contents', 'archive'], help='How to download .tf files from each repository')
+    parser.add_argument('--no-http-cache', action='store_true', help='Disable the on-disk GitHub response cache')
+    parser.add_argument('--no-username-cache', action='store_true', help='Always search for the GitHub username, without reading or writing the username cache')
+    parser.add_argument('--no-review-cache', action='store_true', help='Always generate repository reports, without reading or writing the report cache')
+    parser.add_argument('--refresh-review-cache', action='store_true', help='Regenerate repository reports and overwrite the report cache')
+    parser.add_argument('--no-incremental-review', action='store_true', help='Review every file, instead of only files that changed since their last review')
+    parser.add_argument('--no-triage', action='store_true', help='Send every changed file to the full LLM review, without scoring simple files locally first')
+    parser.add_argument('--triage-min-score', type=float, help='Files scoring less than this in triage are sent to the full review')
+    parser.add_argument('--triage-min-confidence', type=float, help='Files with a triage confidence less than this, from 0 to 1, are sent to the full review')
+    parser.add_argument('--no-blob-cache', action='store_true', help='Download every file, instead of reusing stored files with the same Git blob SHA')
+    parser.add_argument('--llm-concurrency', type=int, help='Maximum number of concurrent repository reviews')
+    parser.add_argument('--llm-requests-per-minute', type=int, help='LLM requests per minute budget')
+    parser.add_argument('--llm-tokens-per-minute', type=int, help='LLM tokens per minute budget')
+    parser.add_argument('--review-batch-tokens', type=int, help='Maximum tokens of Terraform code sent in a single review')
+    parser.add_argument('--no-precheck', action='store_true', help='Send every rule to the LLM, without checking mechanical rules locally first')
+    parser.add_argument('--no-summary-llm', action='store_true', help='Write the engineer summary from the repository scores only, without calling the LLM')
+    parser.add_argument('--no-pipeline', action='store_true', help='Run each stage for every repository before starting the next stage')
+    parser.add_argument('--pipeline-buffer', type=int, help='Maximum repositories waiting between two pipeline stages')
+    parser.add_argument('--stream', action='store_true', help='Write reports to disk token by token as they are generated')
+    parser.add_argument('--stream-stdout', action='store_true', help='Also print reports to stdout as they are generated, implies --stream')
+    parser.add_argument('--resume', action='store_true', help='Resume an interrupted run, skipping completed stages and reviewed repositories')
+    parser.add_argument('--metrics-file', type=str, help='Write the run metrics summary as JSON to this file, default is metrics.json in the run directory')
+    parser.add_argument('--trace-file', type=str, help='Write a trace of every stage, GitHub request and LLM call to this file, in Chrome Trace Event format')
+    parser.add_argument('--style-guide-mode', choices=['relevant', 'full'], help='Send only the style guide rules relevant to each repository, or the full style guide')
 
     args = parser.parse_args()
 
@@ -78,15 +537,96 @@ if __name__ == '__main__':
     config = Config()
     config.set('debug', args.debug)
     config.set('max_repos', args.max_repos)
+    config.set('org_max_repos', args.org_max_repos)
+    config.set('org_workers', args.org_workers)
+    config.set('org_worker', args.org_worker)
+    config.set('batch', args.batch)
+    config.set('batch_backend', args.batch_backend)
+    config.set('batch_poll_seconds', args.batch_poll_seconds)
+    config.set('repo_sort', args.repo_sort)
     config.set('max_files_per_repo', args.max_files_per_repo)
     config.set('max_depth_per_repo', args.max_depth_per_repo)
+    config.set('github_concurrency', args.github_concurrency)
+    config.set('github_max_retries', args.github_max_retries)
+    config.set('discovery_mode', args.discovery_mode)
+    config.set('fetch_mode', args.fetch_mode)
+    if args.no_http_cache:
+      config.set('http_cache', False)
+    if args.no_username_cache:
+      config.set('username_cache', False)
+    if args.no_review_cache:
+      config.set('review_cache', False)
+    config.set('refresh_review_cache', args.refresh_review_cache)
+    if args.no_incremental_review:
+      config.set('incremental_review', False)
+    if args.no_triage:
+      config.set('triage', False)
+    config.set('triage_min_score', args.triage_min_score)
+    config.set('triage_min_confidence', args.triage_min_confidence)
+    if args.no_blob_cache:
+      config.set('blob_cache', False)
+    config.set('llm_concurrency', args.llm_concurrency)
+    config.set('llm_requests_per_minute', args.llm_requests_per_minute)
+    config.set('llm_tokens_per_minute', args.llm_tokens_per_minute)
+    config.set('style_guide_mode', args.style_guide_mode)
+    config.set('review_batch_tokens', args.review_batch_tokens)
+    if args.no_precheck:
+      config.set('precheck', False)
+    if args.no_summary_llm:
+      config.set('summary_llm', False)
+    if args.no_pipeline:
+      config.set('pipeline', False)
+    config.set('pipeline_buffer', args.pipeline_buffer)
+    config.set('stream', args.stream or args.stream_stdout)
+    config.set('stream_stdout', args.stream_stdout)
+    config.set('resume', args.resume)
+    config.set('metrics_file', args.metrics_file)
+    config.set('trace_file', args.trace_file)
 
     if config.get('debug'):
       print("Search: %s" % query)
       print("Debug: %s " % config.get('debug'))
       print("Max repos: %s" % config.get('max_repos'))
+      if args.org:
+        print("Organization: %s" % args.org)
+        print("Org max repos: %s" % config.get('org_max_repos'))
+        print("Org workers: %s (worker only: %s)" % (config.get('org_workers'), config.get('org_worker')))
+      print("Repo sort: %s" % config.get('repo_sort'))
       print("Max files per repo: %s" % config.get('max_files_per_repo'))
       print("Max depth per repo: %s" % config.get('max_depth_per_repo'))
+      print("GitHub concurrency: %s" % config.get('github_concurrency'))
+      print("GitHub max retries: %s" % config.get('github_max_retries'))
+      print("Discovery mode: %s" % config.get('discovery_mode'))
+      print("Fetch mode: %s" % config.get('fetch_mode'))
+      print("HTTP cache: %s" % config.get('http_cache'))
+      print("Username cache: %s" % config.get('username_cache'))
+      print("Review cache: %s (refresh: %s)" % (config.get('review_cache'), config.get('refresh_review_cache')))
+      print("Incremental review: %s" % config.get('incremental_review'))
+      print("Triage: %s (min score: %s, min confidence: %s)" % (config.get('triage'), config.get('triage_min_score'), config.get('triage_min_confidence')))
+      print("LLM concurrency: %s" % config.get('llm_concurrency'))
+      print("LLM requests per minute: %s" % config.get('llm_requests_per_minute'))
+      print("LLM tokens per minute: %s" % config.get('llm_tokens_per_minute'))
+      print("Style guide mode: %s" % config.get('style_guide_mode'))
+      print("Review batch tokens: %s" % config.get('review_batch_tokens'))
+      print("Precheck: %s" % config.get('precheck'))
+      print("Summary LLM: %s" % config.get('summary_llm'))
+      print("Pipeline: %s (buffer: %s)" % (config.get('pipeline'), config.get('pipeline_buffer')))
+      print("Stream: %s (stdout: %s)" % (config.get('stream'), config.get('stream_stdout')))
+      print("Resume: %s" % config.get('resume'))
+      print("Metrics file: %s" % config.get('metrics_file'))
+      print("Trace file: %s" % config.get('trace_file'))
+
+    from agents.github_username import UsernameNotFound
 
-    create_report(query=query,
-                  config=config)
\ No newline at end of file
+    try:
+      if args.org:
+        create_org_report(org=args.org, config=config)
+      else:
+        create_report(query=query, config=config)
+    except GitHubError as e:
+      print("Error: %s" % e)
+      print("Completed stages are saved, rerun with --resume to continue")
+      sys.exit(1)
+    except UsernameNotFound as e:
+      print(e)
+      sys.exit(1)
\ No newline at end of file
@@ -1,10 +1,10 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from langchain.output_parsers import PydanticOutputParser
 from langchain_core.pydantic_v1 import BaseModel, Field
 
 class Report(BaseModel):
     report: str = Field(description="The report generated by the agent.")
-    score: int = Field(description="The score out of 10 for the report.")
+    score: Optional[float] = Field(description="The score out of 10 for the report.")
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -28,7 +28,9 @@ class RepositorySummary(BaseModel):
     name: str = Field(description="The name of the repository")
     full_name: str = Field(description="The full name of the repository")
     tf_files: List[str] = Field(description="The list of Terraform files in the repository")
-    score: int = Field(description="The score out of 10 for the repository")
+    score: Optional[float] = Field(description="The score out of 10 for the repository")
+    file_scores: Dict[str, Optional[float]] = Field(default_factory=dict, description="The score out of 10 for each Terraform file")
+    top_findings: List[str] = Field(default_factory=list, description="The most important feedback for the lowest scoring files")
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -37,6 +39,8 @@ class RepositorySummary(BaseModel):
             "full_name": self.full_name,
             "tf_files": self.tf_files,
             "score": self.score,
+            "file_scores": self.file_scores,
+            "top_findings": self.top_findings,
         }
 
 repository_summary_parser = PydanticOutputParser(pydantic_object=RepositorySummary)
\ No newline at end of file
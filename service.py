@@ -0,0 +1,330 @@
+import argparse
+import json
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+from util.config import Config
+
+# Settings a job may override, and their types
+JOB_OPTIONS = {
+    'max_repos': int,
+    'max_files_per_repo': int,
+    'repo_sort': str,
+    'style_guide_mode': str,
+    'summary_llm': bool,
+    'triage': bool,
+}
+
+JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class Job:
+    """
+    A report requested through the service. Submissions of the same
+    engineer with the same options, while it is queued or running, share
+    one job.
+    """
+
+    def __init__(self, query: str, options: Dict[str, Any], key: str):
+        self.id = uuid.uuid4().hex
+        self.query = query
+        self.options = options
+        self.key = key
+        self.status = "queued"
+        self.submissions = 1
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.report = None
+        self.score = None
+        self.reports_dir = None
+
+    def to_dict(self, include_report: bool = False) -> Dict[str, Any]:
+        job = {
+            "id": self.id,
+            "search": self.query,
+            "options": self.options,
+            "status": self.status,
+            "submissions": self.submissions,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "score": self.score,
+            "files": sorted(os.listdir(self.reports_dir)) if self.status == "done" else [],
+        }
+        if include_report:
+            job["report"] = self.report
+        return job
+
+
+class ReportService:
+    """
+    Runs report jobs on a bounded pool of worker threads, sharing one
+    `SharedState` (pooled GitHub connections, response, username and review
+    caches, LLM scheduler) and the process wide chains and style guide
+    between them.
+
+    - At most `max_queue` jobs wait for a worker, further submissions are
+      rejected until the queue drains.
+    - A submission matching a queued or running job, by engineer and
+      options, returns that job instead of starting another.
+    - Each job writes its reports to its own directory under `reports_dir`.
+    - Every job shares the LLM budgets in `config`, so a lone job can use
+      all of them.
+    - Finished jobs are kept in memory, the oldest are forgotten once there
+      are more than `history`.
+    """
+
+    def __init__(self, config: Config, workers: int = 4, max_queue: int = 100, history: int = 1000):
+        from util.state import SharedState
+
+        self.config = config
+        self.workers = workers
+        self.history = history
+        self.state = SharedState(config)
+
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.in_flight: Dict[str, Job] = {}
+        self.running = 0
+        self.submitted = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.started_at = time.time()
+        self._finished = deque(maxlen=10000)
+        self._lock = threading.Lock()
+
+    def start(self) -> "ReportService":
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name="report-worker-%s" % i, daemon=True).start()
+        return self
+
+    def _key(self, query: str, options: Dict[str, Any]) -> str:
+        # Queries already resolved to a username are coalesced by username
+        username = self.state.username_cache.get(query) if self.state.username_cache else None
+        engineer = "user:" + username.lower() if username else "query:" + " ".join(query.lower().split())
+        return engineer + " " + json.dumps(options, sort_keys=True)
+
+    def submit(self, query: str, options: Optional[Dict[str, Any]] = None) -> Tuple[Job, bool]:
+        """
+        Queues a report job, returning the job and whether it was coalesced
+        with one already in flight. Raises `queue.Full` when the queue is full.
+        """
+        options = options or {}
+        key = self._key(query, options)
+
+        with self._lock:
+            job = self.in_flight.get(key)
+            if job is not None:
+                job.submissions += 1
+                self.coalesced += 1
+                return job, True
+
+            job = Job(query, options, key)
+            try:
+                self.queue.put_nowait(job)
+            except queue.Full:
+                self.rejected += 1
+                raise
+
+            self.submitted += 1
+            self.in_flight[key] = job
+            self.jobs[job.id] = job
+            self._forget()
+            return job, False
+
+    def _forget(self):
+        # Called with the lock held
+        while len(self.jobs) > self.history:
+            oldest = next((j for j in self.jobs.values() if j.status in ("done", "failed")), None)
+            if oldest is None:
+                return
+            del self.jobs[oldest.id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _job_config(self, job: Job) -> Config:
+        config = Config()
+        for key, value in self.config.to_dict().items():
+            config.set(key, value)
+        for key, value in job.options.items():
+            config.set(key, value)
+
+        config.set('reports_dir', os.path.join(self.config.get('reports_dir'), job.id))
+        config.set('metrics_file', os.path.join(self.config.get('reports_dir'), job.id, "metrics.json"))
+        return config
+
+    def _work(self):
+        from main import create_report
+
+        while True:
+            job = self.queue.get()
+            with self._lock:
+                job.status = "running"
+                job.started_at = time.time()
+                self.running += 1
+
+            print("Starting job %s: %s" % (job.id, job.query))
+            status = "failed"
+            try:
+                config = self._job_config(job)
+                report = create_report(job.query, config, state=self.state)
+                job.report, job.score, job.reports_dir = report.report, report.score, config.get('reports_dir')
+                status = "done"
+            except BaseException as e:
+                # Including SystemExit, so a failing job never takes its worker down with it
+                job.error = "%s: %s" % (type(e).__name__, e)
+            finally:
+                print("Finished job %s: %s" % (job.id, status))
+                with self._lock:
+                    job.status = status
+                    job.finished_at = time.time()
+                    self.running -= 1
+                    if status == "done":
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+                    self._finished.append((job.finished_at, job.finished_at - job.started_at))
+                    self.in_flight.pop(job.key, None)
+                self.queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            last_hour = [d for t, d in self._finished if now - t <= 3600]
+            return {
+                "uptime_seconds": now - self.started_at,
+                "workers": self.workers,
+                "queue_depth": self.queue.qsize(),
+                "queue_capacity": self.queue.maxsize,
+                "running": self.running,
+                "submitted": self.submitted,
+                "coalesced": self.coalesced,
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "failed": self.failed,
+                "jobs_last_hour": len(last_hour),
+                "mean_job_seconds_last_hour": sum(last_hour) / len(last_hour) if last_hour else None,
+                "http_cache": self.state.http_cache.stats() if self.state.http_cache else None,
+                "review_cache": self.state.review_cache.stats() if self.state.review_cache else None,
+                "file_reviews": self.state.file_reviews.stats() if self.state.file_reviews else None,
+                "blobs": self.state.blobs.stats() if self.state.blobs else None,
+                "triage": self.state.triage.stats() if self.state.triage else None,
+            }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service: Optional[ReportService] = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body, content_type: str = "application/json; charset=utf-8"):
+        data = body.encode("utf-8") if isinstance(body, str) else json.dumps(body, indent=2).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            return self._send(404, {"error": "Not Found"})
+
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            query = body["search"]
+            options = body.get("options") or {}
+            if not isinstance(query, str) or not query.strip():
+                raise ValueError("search must be a non-empty string")
+            for key, value in options.items():
+                if key not in JOB_OPTIONS or type(value) is not JOB_OPTIONS[key]:
+                    raise ValueError("unsupported option: %s" % key)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            return self._send(400, {"error": "Invalid job: %s" % e})
+
+        try:
+            job, coalesced = self.service.submit(query, options)
+        except queue.Full:
+            return self._send(503, {"error": "Job queue is full, retry later"})
+        self._send(200 if coalesced else 202, dict(job.to_dict(), coalesced=coalesced))
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+
+        if parts == ["stats"]:
+            return self._send(200, self.service.stats())
+
+        if len(parts) < 2 or parts[0] != "jobs" or not JOB_ID.match(parts[1]):
+            return self._send(404, {"error": "Not Found"})
+
+        job = self.service.get(parts[1])
+        if job is None:
+            return self._send(404, {"error": "Unknown job"})
+        if len(parts) == 2:
+            return self._send(200, job.to_dict(include_report=True))
+
+        # /jobs/<id>/files/<name>, e.g. a repository report
+        if len(parts) == 4 and parts[2] == "files":
+            if job.status != "done":
+                return self._send(409, {"error": "Job is " + job.status})
+            if parts[3] not in os.listdir(job.reports_dir):
+                return self._send(404, {"error": "Unknown file"})
+            with open(os.path.join(job.reports_dir, parts[3]), "r") as file:
+                content_type = "application/json" if parts[3].endswith(".json") else "text/markdown"
+                return self._send(200, file.read(), content_type + "; charset=utf-8")
+
+        self._send(404, {"error": "Not Found"})
+
+
+def serve(service: ReportService, host: str = "127.0.0.1", port: int = 8080) -> ThreadingHTTPServer:
+    handler = type("Handler", (_Handler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == '__main__':
+
+    # Parse args
+    parser = argparse.ArgumentParser(description='Serve Github user reports over a local HTTP API')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on')
+    parser.add_argument('--workers', type=int, default=4, help='Number of reports generated at once')
+    parser.add_argument('--max-queue', type=int, default=100, help='Maximum number of jobs waiting for a worker')
+    parser.add_argument('--reports-dir', type=str, default='reports/jobs', help='Directory each job writes its reports to a subdirectory of')
+    parser.add_argument('--llm-requests-per-minute', type=int, help='LLM requests per minute budget, shared by every worker')
+    parser.add_argument('--llm-tokens-per-minute', type=int, help='LLM tokens per minute budget, shared by every worker')
+    parser.add_argument('--debug', action='store_true', help='Enable debug mode')
+
+    args = parser.parse_args()
+
+    # Set config
+    config = Config()
+    config.set('debug', args.debug)
+    config.set('reports_dir', args.reports_dir)
+    config.set('llm_requests_per_minute', args.llm_requests_per_minute)
+    config.set('llm_tokens_per_minute', args.llm_tokens_per_minute)
+
+    service = ReportService(config, workers=args.workers, max_queue=args.max_queue).start()
+    server = serve(service, host=args.host, port=args.port)
+    print("Serving reports on http://%s:%s with %s workers" % (args.host, server.server_address[1], args.workers))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
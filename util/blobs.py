@@ -0,0 +1,97 @@
+import hashlib
+import os
+import threading
+from typing import Callable, Dict, Optional
+
+
+def blob_sha(content: str) -> str:
+    """
+    Returns the Git blob SHA of a file's content, the same SHA GitHub's Trees
+    and Contents APIs report for it.
+    """
+    data = content.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class BlobStore:
+    """
+    Content addressed store of file contents, keyed by Git blob SHA, as one
+    file per blob.
+
+    Files copied between repositories have the same blob SHA, so each is
+    downloaded once per store rather than once per copy. Concurrent fetches
+    of the same blob wait for a single download. Content is only stored if
+    it matches its SHA.
+    """
+
+    def __init__(self, directory: str = ".cache/blobs"):
+        self.directory = directory
+        self.hits = 0
+        self.downloads = 0
+        self._downloading: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, sha: str) -> str:
+        return os.path.join(self.directory, sha[:2], sha)
+
+    def _read(self, sha: str) -> Optional[str]:
+        try:
+            # newline="" keeps line endings as they are, so the content still matches its SHA
+            with open(self._path(sha), "r", encoding="utf-8", newline="") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def get(self, sha: str) -> Optional[str]:
+        content = self._read(sha)
+        if content is not None:
+            with self._lock:
+                self.hits += 1
+        return content
+
+    def put(self, content: str, downloaded: bool = False) -> str:
+        """
+        Stores content, returning its SHA. `downloaded` counts it as a download.
+        """
+        if downloaded:
+            with self._lock:
+                self.downloads += 1
+        sha = blob_sha(content)
+        path = self._path(sha)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = "%s.%s.%s.tmp" % (path, os.getpid(), threading.get_ident())
+            with open(tmp_path, "w", encoding="utf-8", newline="") as file:
+                file.write(content)
+            os.replace(tmp_path, path)
+        return sha
+
+    def fetch(self, sha: str, download: Callable[[], str]) -> str:
+        """
+        Returns the content of a blob, calling `download` only if it is not stored.
+        """
+        with self._lock:
+            lock = self._downloading.setdefault(sha, threading.Lock())
+
+        with lock:
+            content = self._read(sha)
+            if content is not None:
+                with self._lock:
+                    self.hits += 1
+                    self._downloading.pop(sha, None)
+                return content
+
+            content = download()
+            if content and blob_sha(content) == sha:
+                self.put(content)
+            with self._lock:
+                self.downloads += 1
+                self._downloading.pop(sha, None)
+            return content
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "downloads": self.downloads,
+        }
@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+# Settings that do not change what a run produces
+IGNORED_CONFIG = (
+    "debug", "resume", "run_dir", "stream", "stream_stdout",
+    "github_concurrency", "github_max_retries", "http_cache", "http_cache_path", "http_cache_max_mb", "http_cache_ttl_days",
+    "review_cache", "review_cache_dir", "review_cache_max_entries", "refresh_review_cache",
+    "file_review_dir", "blob_cache", "blob_cache_dir", "reports_dir", "pipeline", "pipeline_buffer",
+    "llm_concurrency", "llm_requests_per_minute", "llm_tokens_per_minute",
+    "metrics_file", "trace_file", "batch_dir", "batch_poll_seconds",
+)
+
+
+def run_key(query: str, config: Dict[str, Any]) -> str:
+    settings = {k: v for k, v in config.items() if k not in IGNORED_CONFIG}
+    encoded = json.dumps({"query": query, "config": settings}, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:16]
+
+
+class RunStore:
+    """
+    Persists the output of each stage of a run as JSONL, in a directory
+    keyed by the query and config.
+
+    - `stage` returns a completed stage from disk when resuming, otherwise
+      computes and saves it.
+    - `append` records items as they complete (e.g. one line per reviewed
+      repository), so an interrupted stage can pick up where it left off.
+    """
+
+    def __init__(self, root: str, query: str, config: Dict[str, Any], resume: bool = False):
+        self.path = os.path.join(root, run_key(query, config))
+        self.resume = resume
+        self._lock = threading.Lock()
+
+        if not resume and os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name + ".jsonl")
+
+    def load(self, name: str) -> Optional[List[Dict]]:
+        if not os.path.exists(self._file(name)):
+            return None
+
+        with open(self._file(name), "r") as file:
+            return [json.loads(line) for line in file if line.strip()]
+
+    def save(self, name: str, records: List[Dict]):
+        # Write then rename, so a stage file on disk is always complete
+        tmp_path = self._file(name) + ".tmp"
+        with open(tmp_path, "w") as file:
+            for record in records:
+                file.write(json.dumps(record, separators=(",", ":"), default=str) + "\n")
+        os.replace(tmp_path, self._file(name))
+
+    def append(self, name: str, record: Dict):
+        with self._lock, open(self._file(name), "a") as file:
+            file.write(json.dumps(record, separators=(",", ":"), default=str) + "\n")
+
+    def stage(self, name: str, compute: Callable[[], List[Dict]]) -> List[Dict]:
+        if self.resume:
+            records = self.load(name)
+            if records is not None:
+                print("Resuming from completed stage: " + name)
+                return records
+
+        records = compute()
+        self.save(name, records)
+        return records
@@ -1,13 +1,62 @@
 default_config = {
     'debug': False,
     'max_repos': 3,
+    'org_max_repos': 500,
+    'org_workers': 4,
+    'org_worker': False,
+    'org_queue_dir': '.queue',
+    'org_lease_seconds': 600,
+    'batch': False,
+    'batch_backend': 'openai',
+    'batch_dir': '.cache/batches',
+    'batch_poll_seconds': 60,
+    'repo_sort': 'pushed',
     'max_files_per_repo': 5,
     'max_depth_per_repo': 3,
+    'github_concurrency': 8,
+    'github_max_retries': 5,
+    'discovery_mode': 'tree',
+    'fetch_mode': 'contents',
+    'http_cache': True,
+    'http_cache_path': '.cache/github.sqlite',
+    'http_cache_max_mb': 256,
+    'http_cache_ttl_days': 30,
+    'username_cache': True,
+    'username_cache_path': '.cache/usernames.json',
+    'username_cache_ttl_days': 30,
+    'review_cache': True,
+    'review_cache_dir': '.cache/reviews',
+    'review_cache_max_entries': 500,
+    'refresh_review_cache': False,
+    'incremental_review': True,
+    'file_review_dir': '.cache/file_reviews',
+    'triage': True,
+    'triage_min_score': 10,
+    'triage_min_confidence': 0.7,
+    'blob_cache': True,
+    'blob_cache_dir': '.cache/blobs',
+    'llm_concurrency': 4,
+    'llm_requests_per_minute': 500,
+    'llm_tokens_per_minute': 30000,
+    'style_guide_mode': 'relevant',
+    'review_batch_tokens': 12000,
+    'precheck': True,
+    'summary_llm': True,
+    'pipeline': True,
+    'pipeline_buffer': 2,
+    'reports_dir': 'reports',
+    'stream': False,
+    'stream_stdout': False,
+    'resume': False,
+    'run_dir': '.runs',
+    'metrics_file': None,
+    'trace_file': None,
 }
 
 class Config:
     def __init__(self):
-        self._config = default_config
+        # A copy, so configs of concurrent reports do not share settings
+        self._config = dict(default_config)
 
     def set(self, key, value):
         # If value is None, use default value
@@ -17,4 +66,7 @@ class Config:
         self._config[key] = value
 
     def get(self, key, default=None):
-        return self._config.get(key, default)
\ No newline at end of file
+        return self._config.get(key, default)
+
+    def to_dict(self):
+        return dict(self._config)
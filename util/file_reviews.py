@@ -0,0 +1,149 @@
+import json
+import os
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+from util.blobs import blob_sha
+
+
+class FileReviewStore:
+    """
+    Stores the review of every file of a repository, keyed by the file's blob
+    SHA, as one JSON file per repository.
+
+    Each file's entry holds its SHA, score, feedback section of the report
+    and pre-checked findings. Entries are only returned while the
+    `fingerprint` (prompt, model and review settings) is unchanged, so a new
+    prompt or style guide re-reviews every file.
+
+    Reviews are also stored per blob, so a file copied into another
+    repository, or to another path, is only reviewed once. `claim` and
+    `release` let concurrent reviews of the same blob, in any thread of the
+    process, wait for a single review.
+    """
+
+    def __init__(self, directory: str = ".cache/file_reviews"):
+        self.directory = directory
+        self.reused = 0
+        self.shared = 0
+        self.reviewed = 0
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, full_name: str) -> str:
+        return os.path.join(self.directory, full_name.replace("/", "__") + ".json")
+
+    def load(self, full_name: str, fingerprint: str) -> Dict[str, Dict]:
+        """
+        Returns the stored reviews of a repository's files, by file path.
+        """
+        path = self._path(full_name)
+        if not os.path.exists(path):
+            return {}
+
+        with open(path, "r") as file:
+            stored = json.load(file)
+
+        if stored.get("fingerprint") != fingerprint:
+            return {}
+        return stored.get("files", {})
+
+    def save(self, full_name: str, fingerprint: str, files: Dict[str, Dict]):
+        # Write then rename, so a reader never sees a partial file
+        path = self._path(full_name)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"fingerprint": fingerprint, "files": files}, file, indent=2)
+        os.replace(tmp_path, path)
+
+    def _blob_path(self, fingerprint: str, sha: str) -> str:
+        return os.path.join(self.directory, "blobs", fingerprint[:16], sha + ".json")
+
+    def lookup(self, fingerprint: str, sha: str) -> Optional[Dict]:
+        """
+        Returns the stored review of a blob, from any repository.
+        """
+        try:
+            with open(self._blob_path(fingerprint, sha), "r") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def share(self, fingerprint: str, sha: str, review: Dict):
+        path = self._blob_path(fingerprint, sha)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp_path = "%s.%s.%s.tmp" % (path, os.getpid(), threading.get_ident())
+        with open(tmp_path, "w") as file:
+            json.dump({"score": review["score"], "feedback": review["feedback"]}, file, indent=2)
+        os.replace(tmp_path, path)
+
+    def claim(self, fingerprint: str, sha: str) -> Optional[Future]:
+        """
+        Returns None if the caller should review the blob, then `release` it.
+        Otherwise the blob is already being reviewed, and the returned future
+        resolves to its review, or None if it could not be reviewed.
+        """
+        key = fingerprint + sha
+        with self._lock:
+            if key in self._in_flight:
+                return self._in_flight[key]
+            self._in_flight[key] = Future()
+            return None
+
+    def release(self, fingerprint: str, sha: str, review: Optional[Dict]):
+        if review is not None:
+            self.share(fingerprint, sha, review)
+        with self._lock:
+            in_flight = self._in_flight.pop(fingerprint + sha, None)
+        if in_flight is not None and not in_flight.done():
+            in_flight.set_result(review)
+
+    def count(self, reused: int = 0, shared: int = 0, reviewed: int = 0):
+        # Reviews on several threads share one store
+        with self._lock:
+            self.reused += reused
+            self.shared += shared
+            self.reviewed += reviewed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "reused": self.reused,
+                "shared": self.shared,
+                "reviewed": self.reviewed,
+            }
+
+
+def changed_files(files: List[Dict], stored: Dict[str, Dict], shas: Dict[str, str]) -> List[Dict]:
+    """
+    Returns the files whose blob SHA differs from their stored review, or
+    that have no stored review.
+    """
+    return [f for f in files if stored.get(f["file_path"], {}).get("sha") != shas[f["file_path"]]]
+
+
+def file_shas(repo: Dict) -> Dict[str, str]:
+    """
+    Returns the blob SHA of every file in a repository, using the SHAs from
+    the Trees API when they are known and hashing the content otherwise.
+
+    A file without content, e.g. because it could not be fetched, always
+    gets the SHA of its content, so it never matches the review of its blob.
+    """
+    known: Dict[str, Optional[str]] = repo.get("hcl_file_shas") or {}
+    return {f["file_path"]: (f["content"] and known.get(f["file_path"])) or blob_sha(f["content"])
+            for f in repo["files"]}
+
+
+def relocate(review: Dict, file_path: str, sha: str, findings: List[Dict]) -> Dict:
+    """
+    Returns a file's review for use at `file_path`, e.g. when it was
+    reviewed in another repository, with that file's own findings.
+    """
+    lines = review["feedback"].split("\n", 1)
+    if lines[0].startswith("### "):
+        lines[0] = "### " + file_path
+    return dict(review, feedback="\n".join(lines), sha=sha, findings=findings)
@@ -5,4 +5,4 @@ def write_file_to_disk(content: str, filename):
 def load_file_as_string(path: str) -> str:
     with open(path, 'r') as file:
         string = file.read()
-    return string
\ No newline at end of file
+    return string
@@ -0,0 +1,186 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from util.http_cache import HTTPCache
+from util.metrics import get_metrics
+from util.rate_limit import GitHubError, RateLimitGovernor, TRANSIENT_STATUSES, is_rate_limited
+
+gh_pat = os.environ.get('GH_PAT')
+
+GITHUB_API_URL = "https://api.github.com"
+
+
+def endpoint_name(url: str) -> str:
+    """
+    Returns the API endpoint of a request URL with the owner, repository and
+    path left out, e.g. "repos/contents" or "users/repos", for grouping metrics.
+    """
+    path = url.split("://", 1)[-1].split("/", 1)[-1].split("?", 1)[0]
+    parts = [p for p in path.split("/") if p]
+
+    if parts[:1] == ["repos"] and len(parts) > 3:
+        return "repos/git/" + parts[4] if parts[3] == "git" and len(parts) > 4 else "repos/" + parts[3]
+    if parts[:1] in (["users"], ["orgs"]) and len(parts) > 2:
+        return parts[0] + "/" + parts[2]
+    return parts[0] if parts else ""
+
+
+class GitHubClient:
+    """
+    Shared GitHub API client.
+
+    - Reuses a single `requests.Session`, so TLS connections are kept alive
+      and pooled between calls.
+    - Limits the number of in-flight requests to `max_concurrency`, across
+      every thread using the client.
+    - `map` fans work out over a thread pool, so repositories, directories
+      and files can be fetched in parallel.
+    - When given a `cache`, requests are made conditional and unchanged
+      responses are served from disk.
+    - Every request is recorded in the run's metrics, per endpoint.
+    - Requests are paced by a shared `RateLimitGovernor`. Rate limited,
+      5xx and connection failures are retried up to `max_retries` times
+      with backoff, then raised as `GitHubError`.
+    """
+
+    def __init__(self,
+                 token: str = gh_pat,
+                 max_concurrency: int = 8,
+                 cache: Optional[HTTPCache] = None,
+                 max_retries: int = 5):
+        self.max_concurrency = max_concurrency
+        self.cache = cache
+        self.max_retries = max_retries
+        self.governor = RateLimitGovernor()
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_concurrency, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Accept": "application/vnd.github.v3+json",
+            "X-GitHub-Api-Version": "2022-11-28",
+        })
+        if token:
+            self.session.headers["Authorization"] = "Bearer " + token
+
+    def url(self, path: str) -> str:
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return GITHUB_API_URL + "/" + path.lstrip("/")
+
+    def _send(self, url: str, **kwargs) -> requests.Response:
+        attempt = 0
+        while True:
+            self.governor.wait()
+            error, rate_limited = None, False
+            try:
+                with self._semaphore:
+                    start = time.perf_counter()
+                    response = self.session.get(url, **kwargs)
+                    end = time.perf_counter()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                response, error = None, e
+
+            if response is not None:
+                self.governor.update(response.headers)
+
+                # The size of a streamed body is only known up front from its headers
+                if kwargs.get("stream"):
+                    size = int(response.headers.get("Content-Length", 0))
+                else:
+                    size = len(response.content)
+                get_metrics().record_request(endpoint_name(url), response.status_code, response.headers, size, start, end)
+
+                rate_limited = is_rate_limited(response.status_code, response.headers,
+                                               b"" if kwargs.get("stream") else response.content)
+                if not rate_limited and response.status_code not in TRANSIENT_STATUSES:
+                    return response
+                error = "HTTP %s" % response.status_code
+
+            if attempt >= self.max_retries:
+                if response is not None:
+                    response.close()
+                raise GitHubError("GET %s failed after %s attempts: %s" % (url, attempt + 1, error))
+
+            headers = response.headers if response is not None else None
+            delay = self.governor.retry_delay(attempt, headers, rate_limited=rate_limited)
+            if rate_limited:
+                # Every worker would hit the same limit, so pause them all
+                self.governor.pause(delay)
+                response.close()
+            print("GitHub request failed (%s), retrying in %.1fs: %s" % (error, delay, url))
+            get_metrics().record_retry(endpoint_name(url))
+            time.sleep(delay)
+            attempt += 1
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        # Streamed bodies are never cached
+        if self.cache is None or kwargs.get("stream"):
+            return self._send(self.url(path), **kwargs)
+
+        headers = dict(self.session.headers)
+        headers.update(kwargs.pop("headers", None) or {})
+        url = requests.Request("GET", self.url(path), params=kwargs.pop("params", None)).prepare().url
+        key = HTTPCache.key(url, headers)
+        headers.update(self.cache.conditional_headers(key))
+
+        response = self._send(url, headers=headers, **kwargs)
+
+        if response.status_code == 304:
+            cached = self.cache.not_modified(key, response)
+            if cached is not None:
+                return cached
+
+            # The entry was evicted in the meantime, fetch it in full
+            headers.pop("If-None-Match", None)
+            headers.pop("If-Modified-Since", None)
+            response = self._send(url, headers=headers, **kwargs)
+
+        self.cache.store(key, response)
+        return response
+
+    def map(self, fn: Callable, items: Iterable) -> List:
+        """
+        Calls `fn` for every item in parallel, returning results in order.
+        HTTP concurrency is still bounded by `max_concurrency`, so nested
+        calls to `map` are safe.
+        """
+        items = list(items)
+        if len(items) <= 1:
+            return [fn(i) for i in items]
+
+        # Run in a copy of the caller's context, so requests are recorded in the caller's metrics
+        context = contextvars.copy_context()
+        with ThreadPoolExecutor(max_workers=min(len(items), self.max_concurrency)) as executor:
+            return list(executor.map(lambda item: context.copy().run(fn, item), items))
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> GitHubClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GitHubClient()
+        return _client
+
+
+def configure_client(max_concurrency: int = 8, cache: Optional[HTTPCache] = None, max_retries: int = 5) -> GitHubClient:
+    """
+    Replaces the shared client, e.g. with a different concurrency limit or a response cache.
+    """
+    global _client
+    with _client_lock:
+        _client = GitHubClient(max_concurrency=max_concurrency, cache=cache, max_retries=max_retries)
+        return _client
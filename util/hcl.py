@@ -0,0 +1,228 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Set
+
+# A block header, e.g. `resource "aws_instance" "web" {`, `locals {` or `lifecycle {`.
+# Attributes (`tags = {`) are not matched, because they contain an `=`.
+BLOCK_HEADER = re.compile(r'^\s*([A-Za-z_][\w-]*)((?:\s+(?:"[^"]*"|[A-Za-z_][\w-]*))*)\s*\{')
+BLOCK_LABEL = re.compile(r'"([^"]*)"|([A-Za-z_][\w-]*)')
+ATTRIBUTE = re.compile(r'^\s*([A-Za-z_][\w-]*)\s*=(?!=)')
+
+
+@dataclass
+class Attribute:
+    name: str
+    line: int
+    end_line: int
+    value: str
+
+
+@dataclass
+class Block:
+    type: str
+    labels: List[str]
+    line: int
+    end_line: int
+    attributes: Dict[str, Attribute] = field(default_factory=dict)
+    blocks: List["Block"] = field(default_factory=list)
+
+    def walk(self) -> Iterator["Block"]:
+        """
+        Yields every nested block, depth first.
+        """
+        for block in self.blocks:
+            yield block
+            yield from block.walk()
+
+
+def _code_lines(content: str) -> List[str]:
+    """
+    Returns each line with comments removed, string contents emptied and
+    heredoc bodies blanked, so only the structure of the file is left.
+    """
+    code_lines = []
+    in_block_comment = False
+    heredoc_end = None
+
+    for line in content.split("\n"):
+        if heredoc_end is not None:
+            code_lines.append("")
+            if line.strip() == heredoc_end:
+                heredoc_end = None
+            continue
+
+        code = []
+        in_string = False
+        i = 0
+        while i < len(line):
+            c = line[i]
+            if in_block_comment:
+                if line.startswith("*/", i):
+                    in_block_comment = False
+                    i += 1
+            elif in_string:
+                if c == "\\":
+                    i += 1
+                elif c == '"':
+                    in_string = False
+                    code.append(c)
+            elif c == '"':
+                in_string = True
+                code.append(c)
+            elif c == "#" or line.startswith("//", i):
+                break
+            elif line.startswith("/*", i):
+                in_block_comment = True
+                i += 1
+            else:
+                code.append(c)
+            i += 1
+
+        code = "".join(code)
+        match = HEREDOC_START.search(code)
+        if match:
+            heredoc_end = match.group(1)
+        code_lines.append(code)
+
+    return code_lines
+
+
+def _bracket_balance(code: str) -> int:
+    return sum(code.count(c) for c in "{[(") - sum(code.count(c) for c in "}])")
+
+
+def scan_blocks(content: str) -> List[Block]:
+    """
+    Scans a Terraform file into its top level blocks, with their nested
+    blocks and attributes and the line numbers (from 1) of each.
+
+    This is not a full HCL parser, it only understands the structure
+    needed for style checks. Single line blocks, e.g.
+    `variable "x" { type = string }`, are returned with their attribute.
+    """
+    lines = content.split("\n")
+    root = Block(type="", labels=[], line=0, end_line=len(lines))
+    stack = [root]
+    attribute = None
+    expression_depth = 0
+
+    for number, (line, code) in enumerate(zip(lines, _code_lines(content)), start=1):
+
+        # Inside a multi line attribute value
+        if expression_depth > 0:
+            expression_depth += _bracket_balance(code)
+            if expression_depth <= 0:
+                expression_depth = 0
+                attribute.end_line = number
+                attribute.value = "\n".join(lines[attribute.line - 1:number]).split("=", 1)[1].strip()
+            continue
+
+        header = BLOCK_HEADER.match(line)
+        if header and "{" in code and "=" not in code.split("{", 1)[0]:
+            labels = [quoted or bare for quoted, bare in BLOCK_LABEL.findall(header.group(2))]
+            block = Block(type=header.group(1), labels=labels, line=number, end_line=number)
+            stack[-1].blocks.append(block)
+            if code.count("{") > code.count("}"):
+                stack.append(block)
+            else:
+                # A single line block holds at most one attribute, e.g. `variable "x" { type = string }`
+                body = line.split("{", 1)[1].rsplit("}", 1)[0]
+                match = ATTRIBUTE.match(code.split("{", 1)[1])
+                if match and "=" in body:
+                    block.attributes[match.group(1)] = Attribute(name=match.group(1), line=number, end_line=number,
+                                                                 value=body.split("=", 1)[1].strip())
+            continue
+
+        match = ATTRIBUTE.match(code)
+        if match and len(stack) > 1:
+            attribute = Attribute(name=match.group(1), line=number, end_line=number,
+                                  value=line.split("=", 1)[1].strip())
+            stack[-1].attributes.setdefault(attribute.name, attribute)
+            expression_depth = max(0, _bracket_balance(code))
+            continue
+
+        for c in code:
+            if c == "}" and len(stack) > 1:
+                stack.pop().end_line = number
+
+    return root.blocks
+
+
+def find_block_types(content: str) -> Set[str]:
+    """
+    Returns the type of every block in a Terraform file, at any nesting
+    level, e.g. {"resource", "variable", "lifecycle", "dynamic"}.
+    """
+    types = set()
+    for block in scan_blocks(content):
+        types.add(block.type)
+        types.update(b.type for b in block.walk())
+    return types
+
+
+HEREDOC_START = re.compile(r'<<-?\s*"?([A-Za-z_]\w*)"?\s*$')
+LICENSE_WORDS = ("copyright", "license", "spdx")
+
+# Runs of at least this many comment-only lines are treated as noise,
+# e.g. commented out code or banners
+COMMENT_BLOCK_LINES = 3
+
+
+def _is_comment(line: str) -> bool:
+    stripped = line.strip()
+    return stripped.startswith("#") or stripped.startswith("//") or stripped.startswith("/*") \
+        or stripped.startswith("*")
+
+
+def strip_noise(content: str) -> str:
+    """
+    Blanks out lines that do not need reviewing, to save tokens:
+    - a license header at the top of the file
+    - runs of comment-only lines, such as commented out code
+
+    Lines are blanked rather than removed, so line numbers stay correct.
+    Heredoc bodies are never touched.
+    """
+    lines = content.split("\n")
+    comment = [False] * len(lines)
+
+    heredoc_end = None
+    for i, line in enumerate(lines):
+        if heredoc_end is not None:
+            if line.strip() == heredoc_end:
+                heredoc_end = None
+            continue
+
+        match = HEREDOC_START.search(line)
+        if match:
+            heredoc_end = match.group(1)
+            continue
+
+        comment[i] = _is_comment(line)
+
+    noise = [False] * len(lines)
+
+    # License header: the leading comment lines, if they mention a license
+    header_end = 0
+    while header_end < len(lines) and (comment[header_end] or not lines[header_end].strip()):
+        header_end += 1
+    header = "\n".join(lines[:header_end]).lower()
+    if any(word in header for word in LICENSE_WORDS):
+        for i in range(header_end):
+            noise[i] = True
+
+    # Comment blocks
+    i = 0
+    while i < len(lines):
+        if not comment[i]:
+            i += 1
+            continue
+        j = i
+        while j < len(lines) and comment[j]:
+            j += 1
+        if j - i >= COMMENT_BLOCK_LINES:
+            for k in range(i, j):
+                noise[k] = True
+        i = j
+
+    return "\n".join("" if noise[i] else line for i, line in enumerate(lines))
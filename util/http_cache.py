@@ -0,0 +1,160 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+class HTTPCache:
+    """
+    Persistent cache of GitHub API responses, stored in SQLite.
+
+    Responses that carry an `ETag` or `Last-Modified` header are stored with
+    their body. Later requests for the same URL are sent as conditional
+    requests, and a `304 Not Modified` is answered from the cache. GitHub
+    does not count 304 responses against the rate limit.
+
+    - Entries not revalidated within `ttl_seconds` are dropped.
+    - Once the stored bodies exceed `max_bytes`, the least recently used
+      entries are evicted.
+    """
+
+    def __init__(self, path: str = ".cache/github.sqlite",
+                 max_bytes: int = 256 * 1024 * 1024,
+                 ttl_seconds: int = 30 * 24 * 60 * 60):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self._db.commit()
+
+    @staticmethod
+    def key(url: str, headers: Dict) -> str:
+        # The same URL returns different bodies for different media types
+        return headers.get("Accept", "") + " " + url
+
+    def conditional_headers(self, key: str) -> Dict[str, str]:
+        """
+        Returns the headers to revalidate a cached response, or an empty
+        dict when the response is not cached.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, stored_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                return {}
+
+            etag, last_modified, stored_at = row
+            if time.time() - stored_at > self.ttl_seconds:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                return {}
+
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def not_modified(self, key: str, response: requests.Response) -> Optional[requests.Response]:
+        """
+        Builds a response from the cache after the server answered 304.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT headers, body FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            self._db.execute(
+                "UPDATE responses SET stored_at = ?, accessed_at = ? WHERE key = ?", (now, now, key)
+            )
+            self._db.commit()
+            self.hits += 1
+
+        headers, body = row
+        cached = requests.Response()
+        cached.status_code = 200
+        cached.url = response.url
+        cached.request = response.request
+        cached.headers = CaseInsensitiveDict(json.loads(headers))
+        # Keep the latest rate limit headers from the 304
+        for name, value in response.headers.items():
+            if name.lower().startswith("x-ratelimit-"):
+                cached.headers[name] = value
+        cached._content = body
+        cached.encoding = "utf-8"
+        return cached
+
+    def store(self, key: str, response: requests.Response):
+        """
+        Stores a successful response, if it can be revalidated later.
+        """
+        with self._lock:
+            self.misses += 1
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if response.status_code != 200 or not (etag or last_modified):
+            return
+
+        body = response.content
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, json.dumps(dict(response.headers)), body, etag, last_modified, len(body), now, now),
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        self._db.execute("DELETE FROM responses WHERE stored_at < ?", (time.time() - self.ttl_seconds,))
+
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        for key, size in self._db.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+        ).fetchall():
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+        }
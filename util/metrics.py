@@ -0,0 +1,204 @@
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class Metrics:
+    """
+    Collects timings and counters for a single run.
+
+    - `span` times a block of work, e.g. a stage of `create_report` or the
+      review of one repository. Spans in the "stage" category are also
+      totalled per stage name.
+    - `record_request` counts GitHub requests per endpoint and tracks the
+      `X-RateLimit-*` headers, keeping the lowest remaining budget seen.
+      `record_retry` counts the requests that were retried.
+    - `record_llm_call` counts tokens and latency per chain or agent.
+
+    `summary` returns everything as a JSON serializable dict, and
+    `write_trace` writes every span in the Chrome Trace Event format, which
+    can be opened in https://ui.perfetto.dev or chrome://tracing.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+        self.spans = []
+        self.stages = {}
+        self.github = {}
+        self.rate_limit = {}
+        self.llm = {}
+
+    def _now(self) -> float:
+        return time.perf_counter() - self._origin
+
+    def add_span(self, name: str, category: str, start: float, end: float, **attributes):
+        with self._lock:
+            self.spans.append({
+                "name": name,
+                "category": category,
+                "start": start,
+                "duration": end - start,
+                "thread": threading.get_ident(),
+                "attributes": attributes,
+            })
+            if category == "stage":
+                self.stages[name] = self.stages.get(name, 0.0) + end - start
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str = "stage", **attributes):
+        start = self._now()
+        try:
+            yield
+        finally:
+            self.add_span(name, category, start, self._now(), **attributes)
+
+    def record_request(self, endpoint: str, status: int, headers: Dict[str, str], size: int, start: float, end: float):
+        """
+        Records a GitHub API request. `start` and `end` are `time.perf_counter()` values.
+        """
+        start -= self._origin
+        end -= self._origin
+        self.add_span(endpoint, "github", start, end, status=status, bytes=size)
+
+        with self._lock:
+            stats = self._github_endpoint(endpoint)
+            stats["requests"] += 1
+            stats["bytes"] += size
+            stats["seconds"] += end - start
+            if status == 304:
+                stats["not_modified"] += 1
+            elif status >= 400:
+                stats["errors"] += 1
+
+            remaining = headers.get("X-RateLimit-Remaining")
+            if remaining is None:
+                return
+
+            resource = headers.get("X-RateLimit-Resource", "core")
+            limit = self.rate_limit.setdefault(resource, {"min_remaining": int(remaining)})
+            limit["limit"] = int(headers.get("X-RateLimit-Limit", 0))
+            limit["remaining"] = int(remaining)
+            limit["min_remaining"] = min(limit["min_remaining"], int(remaining))
+            limit["reset"] = int(headers.get("X-RateLimit-Reset", 0))
+
+    def _github_endpoint(self, endpoint: str) -> Dict[str, Any]:
+        # Called with the lock held
+        return self.github.setdefault(endpoint, {
+            "requests": 0, "not_modified": 0, "errors": 0, "retries": 0, "bytes": 0, "seconds": 0.0,
+        })
+
+    def record_retry(self, endpoint: str):
+        """
+        Records a GitHub request that failed and is about to be retried.
+        """
+        with self._lock:
+            self._github_endpoint(endpoint)["retries"] += 1
+
+    def record_llm_call(self,
+                        name: str,
+                        model: str,
+                        start: float,
+                        end: float,
+                        prompt_tokens: int,
+                        completion_tokens: int,
+                        estimated: bool = False,
+                        error: Optional[str] = None):
+        """
+        Records a single LLM call. `start` and `end` are `time.perf_counter()` values.
+        """
+        start -= self._origin
+        end -= self._origin
+        self.add_span(name, "llm", start, end, model=model, prompt_tokens=prompt_tokens,
+                      completion_tokens=completion_tokens, estimated=estimated, error=error)
+
+        with self._lock:
+            stats = self.llm.setdefault(name, {
+                "calls": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                "seconds": 0.0, "max_seconds": 0.0, "estimated_tokens": False, "models": [],
+            })
+            stats["calls"] += 1
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+            stats["seconds"] += end - start
+            stats["max_seconds"] = max(stats["max_seconds"], end - start)
+            stats["estimated_tokens"] = stats["estimated_tokens"] or estimated
+            if error:
+                stats["errors"] += 1
+            if model not in stats["models"]:
+                stats["models"].append(model)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            github = {k: dict(v) for k, v in self.github.items()}
+            llm = {k: dict(v) for k, v in self.llm.items()}
+            return {
+                "started_at": self.started_at,
+                "wall_seconds": self._now(),
+                "stages": dict(self.stages),
+                "github": {
+                    "requests": sum(s["requests"] for s in github.values()),
+                    "not_modified": sum(s["not_modified"] for s in github.values()),
+                    "errors": sum(s["errors"] for s in github.values()),
+                    "retries": sum(s["retries"] for s in github.values()),
+                    "bytes": sum(s["bytes"] for s in github.values()),
+                    "endpoints": github,
+                    "rate_limit": {k: dict(v) for k, v in self.rate_limit.items()},
+                },
+                "llm": {
+                    "calls": sum(s["calls"] for s in llm.values()),
+                    "prompt_tokens": sum(s["prompt_tokens"] for s in llm.values()),
+                    "completion_tokens": sum(s["completion_tokens"] for s in llm.values()),
+                    "chains": llm,
+                },
+            }
+
+    def write_summary(self, path: str):
+        _write_json(self.summary(), path)
+
+    def write_trace(self, path: str):
+        # Async begin/end pairs, so overlapping spans on one thread are shown on separate tracks
+        events = []
+        with self._lock:
+            for i, span in enumerate(self.spans):
+                event = {"name": span["name"], "cat": span["category"], "id": i, "pid": os.getpid(), "tid": span["thread"]}
+                events.append(dict(event, ph="b", ts=span["start"] * 1e6, args=span["attributes"]))
+                events.append(dict(event, ph="e", ts=(span["start"] + span["duration"]) * 1e6))
+
+        _write_json({"traceEvents": events, "displayTimeUnit": "ms"}, path)
+
+
+def _write_json(data: Dict, path: str):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(data, file, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+_default_metrics = Metrics()
+_metrics: contextvars.ContextVar = contextvars.ContextVar("metrics", default=None)
+
+
+def get_metrics() -> Metrics:
+    return _metrics.get() or _default_metrics
+
+
+def reset_metrics() -> Metrics:
+    """
+    Starts collecting metrics for a new run, in the current thread and the
+    tasks and `GitHubClient.map` threads it starts. Reports running in other
+    threads of the same process keep their own metrics.
+    """
+    metrics = Metrics()
+    _metrics.set(metrics)
+    return metrics
@@ -0,0 +1,74 @@
+import asyncio
+from typing import Any, Callable, Iterable, List, NamedTuple
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+class Stage(NamedTuple):
+    """
+    A step of a pipeline. `fn` is a coroutine function, or with `blocking`
+    a plain function that is run in a thread. `workers` items are processed
+    at once. Items for which `fn` returns None are dropped.
+    """
+    name: str
+    fn: Callable[[Any], Any]
+    workers: int = 1
+    blocking: bool = False
+
+
+async def run_pipeline(items: Iterable, stages: List[Stage], buffer: int = 2) -> List:
+    """
+    Passes every item through `stages` in order, returning the output of the
+    last stage in completion order.
+
+    Stages run concurrently and each item moves on as soon as its stage is
+    done, so later items are still in early stages while earlier items are
+    in later ones. At most `buffer` items wait between two stages, so a fast
+    stage blocks rather than piling up work, e.g. downloaded files, in
+    front of a slow one.
+
+    If any stage raises, the other stages are cancelled and the error is raised.
+    """
+    queues = [asyncio.Queue(maxsize=buffer) for _ in stages]
+    results = []
+
+    async def feed():
+        for item in items:
+            await queues[0].put(item)
+        for _ in range(stages[0].workers):
+            await queues[0].put(_DONE)
+
+    async def work(i: int, stage: Stage):
+        while True:
+            item = await queues[i].get()
+            if item is _DONE:
+                return
+
+            if stage.blocking:
+                # Threads get a copy of the current context, so calls are recorded in this run's metrics
+                output = await asyncio.to_thread(stage.fn, item)
+            else:
+                output = await stage.fn(item)
+
+            if output is None:
+                continue
+            if i + 1 < len(stages):
+                await queues[i + 1].put(output)
+            else:
+                results.append(output)
+
+    async def run_stage(i: int, stage: Stage):
+        await asyncio.gather(*[work(i, stage) for _ in range(stage.workers)])
+        if i + 1 < len(stages):
+            for _ in range(stages[i + 1].workers):
+                await queues[i + 1].put(_DONE)
+
+    tasks = [asyncio.ensure_future(feed())] + [asyncio.ensure_future(run_stage(i, s)) for i, s in enumerate(stages)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    return results
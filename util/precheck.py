@@ -0,0 +1,139 @@
+import os
+import re
+from typing import Dict, List
+
+from util.hcl import Block, scan_blocks
+
+SNAKE_CASE = re.compile(r'^[a-z0-9]+(_[a-z0-9]+)*$')
+
+# Rules that are fully checked here, so the LLM does not need to judge them.
+# TFNFR18 is checked for a missing `type` only, whether the type is precise
+# enough (e.g. no `any` without a reason) is still left to the LLM.
+CHECKED_RULES = ["TFNFR4", "TFNFR10", "TFNFR17", "TFNFR21", "TFNFR22", "TFNFR31", "TFNFR32"]
+
+
+def _finding(rule: str, file_path: str, line: int, message: str) -> Dict:
+    return {
+        "rule": rule,
+        "file_path": file_path,
+        "line": line,
+        "message": message,
+    }
+
+
+def _check_names(file_path: str, block: Block) -> List[Dict]:
+    """
+    TFNFR4: locals, variables, outputs, resources, data sources and modules use lower snake_case.
+    """
+    names = []
+    if block.type in ("variable", "output", "module") and block.labels:
+        names.append((block.type, block.labels[0], block.line))
+    elif block.type in ("resource", "data") and len(block.labels) > 1:
+        names.append((block.type, block.labels[1], block.line))
+    elif block.type == "locals":
+        names.extend(("local", a.name, a.line) for a in block.attributes.values())
+
+    return [
+        _finding("TFNFR4", file_path, line, f'{kind} name `{name}` is not lower snake_case')
+        for kind, name, line in names if not SNAKE_CASE.match(name)
+    ]
+
+
+def _check_ignore_changes(file_path: str, block: Block) -> List[Dict]:
+    """
+    TFNFR10: no double quotes in `ignore_changes`.
+    """
+    findings = []
+    for nested in block.walk():
+        ignore_changes = nested.attributes.get("ignore_changes")
+        if nested.type == "lifecycle" and ignore_changes and '"' in ignore_changes.value:
+            findings.append(_finding("TFNFR10", file_path, ignore_changes.line,
+                                     "`ignore_changes` attributes must not be quoted"))
+    return findings
+
+
+def _check_variable(file_path: str, block: Block) -> List[Dict]:
+    """
+    TFNFR17, TFNFR18, TFNFR21: variables have a description and a type,
+    and do not set `nullable = true`.
+    """
+    if block.type != "variable":
+        return []
+
+    name = block.labels[0] if block.labels else ""
+    findings = []
+    if "description" not in block.attributes:
+        findings.append(_finding("TFNFR17", file_path, block.line, f'variable `{name}` has no `description`'))
+    if "type" not in block.attributes:
+        findings.append(_finding("TFNFR18", file_path, block.line, f'variable `{name}` has no `type`'))
+
+    nullable = block.attributes.get("nullable")
+    if nullable and nullable.value == "true":
+        findings.append(_finding("TFNFR21", file_path, nullable.line, f'variable `{name}` sets `nullable = true`'))
+
+    return findings
+
+
+def _check_sensitive(file_path: str, block: Block) -> List[Dict]:
+    """
+    TFNFR22: variables and outputs do not set `sensitive = false`.
+    """
+    sensitive = block.attributes.get("sensitive")
+    if block.type in ("variable", "output") and sensitive and sensitive.value == "false":
+        name = block.labels[0] if block.labels else ""
+        return [_finding("TFNFR22", file_path, sensitive.line, f'{block.type} `{name}` sets `sensitive = false`')]
+    return []
+
+
+def _check_locals_order(file_path: str, block: Block) -> List[Dict]:
+    """
+    TFNFR32: locals are in alphabetical order.
+    """
+    if block.type != "locals":
+        return []
+
+    names = list(block.attributes)
+    if names == sorted(names):
+        return []
+    return [_finding("TFNFR32", file_path, block.line,
+                     "locals are not in alphabetical order, expected: " + ", ".join(sorted(names)))]
+
+
+def check_file(file_path: str, content: str) -> List[Dict]:
+    """
+    Runs every deterministic rule against a single Terraform file.
+    """
+    findings = []
+    blocks = scan_blocks(content)
+
+    for block in blocks:
+        findings.extend(_check_names(file_path, block))
+        findings.extend(_check_ignore_changes(file_path, block))
+        findings.extend(_check_variable(file_path, block))
+        findings.extend(_check_sensitive(file_path, block))
+        findings.extend(_check_locals_order(file_path, block))
+
+    # TFNFR31: locals.tf contains only locals blocks
+    if os.path.basename(file_path) == "locals.tf":
+        for block in blocks:
+            if block.type != "locals":
+                findings.append(_finding("TFNFR31", file_path, block.line,
+                                         f'locals.tf must only contain `locals` blocks, found `{block.type}`'))
+
+    return sorted(findings, key=lambda f: (f["line"], f["rule"]))
+
+
+def check_files(files: List[Dict]) -> List[Dict]:
+    """
+    Runs every deterministic rule against a list of `{"file_path", "content"}` files.
+    """
+    findings = []
+    for f in files:
+        findings.extend(check_file(f["file_path"], f["content"]))
+    return findings
+
+
+def format_findings(findings: List[Dict]) -> str:
+    if not findings:
+        return "None"
+    return "\n".join("- %s:%s [%s] %s" % (f["file_path"], f["line"], f["rule"], f["message"]) for f in findings)
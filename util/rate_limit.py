@@ -0,0 +1,131 @@
+import random
+import threading
+import time
+from typing import Mapping, Optional
+
+# Statuses that are worth retrying, on top of rate limited 403s
+TRANSIENT_STATUSES = (429, 500, 502, 503, 504)
+
+
+class GitHubError(Exception):
+    """
+    A GitHub request that still failed after every retry.
+
+    Raised instead of returning empty data, so a rate limit or an outage
+    does not silently drop repositories or files from a report.
+    """
+
+
+def is_rate_limited(status: int, headers: Mapping[str, str], body: bytes = b"") -> bool:
+    """
+    Returns True for primary and secondary rate limit responses.
+    """
+    if status == 429:
+        return True
+    if status != 403:
+        return False
+    return headers.get("X-RateLimit-Remaining") == "0" or "Retry-After" in headers or b"rate limit" in body.lower()
+
+
+def backoff_seconds(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """
+    Jittered exponential backoff, so concurrent workers do not retry in lockstep.
+    """
+    return min(cap, base * 2 ** attempt) * (0.5 + random.random())
+
+
+class RateLimitGovernor:
+    """
+    Paces GitHub requests across every thread sharing a client.
+
+    - Tracks the budget from the `X-RateLimit-Remaining`, `X-RateLimit-Limit`
+      and `X-RateLimit-Reset` headers of every response.
+    - Requests go out at full speed while more than `reserve` of the budget
+      is left. Below that, request starts are spread evenly over the time
+      left until the reset, and once the budget is spent every worker waits
+      for the reset.
+    - `pause` stops every worker, e.g. for a `Retry-After` or a secondary
+      rate limit.
+    """
+
+    def __init__(self, reserve: float = 0.1):
+        self.reserve = reserve
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None
+        self._paused_until = 0.0
+        self._next_start = 0.0
+        self._lock = threading.Lock()
+
+    def _delay(self, now: float) -> float:
+        # Called with the lock held, returns how long the caller has to wait
+        delay = max(0.0, self._paused_until - now)
+        if self.remaining is None or self.reset_at is None:
+            return delay
+
+        window = max(self.reset_at - now, 0.0)
+        if self.remaining <= 0 and window > 0:
+            return max(delay, window)
+
+        if self.limit and self.remaining < self.limit * self.reserve and window > 0:
+            start = max(now + delay, self._next_start)
+            self._next_start = start + window / self.remaining
+            return start - now
+
+        return delay
+
+    def wait(self):
+        """
+        Blocks until the caller may send a request.
+        """
+        with self._lock:
+            delay = self._delay(time.time())
+
+        if delay >= 5:
+            print("Waiting %.0fs for the GitHub rate limit" % delay)
+        if delay > 0:
+            time.sleep(delay)
+
+    def update(self, headers: Mapping[str, str]):
+        """
+        Updates the budget from a response's `X-RateLimit-*` headers.
+        """
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+
+        with self._lock:
+            # Responses can arrive out of order, keep the lowest count within a window
+            if self.reset_at == int(reset) and self.remaining is not None:
+                self.remaining = min(self.remaining, int(remaining))
+            else:
+                self.remaining = int(remaining)
+            self.reset_at = int(reset)
+            self.limit = int(headers.get("X-RateLimit-Limit", self.limit or 0)) or None
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.time() + seconds)
+
+    def retry_delay(self, attempt: int, headers: Optional[Mapping[str, str]] = None, rate_limited: bool = False) -> float:
+        """
+        Returns how long to wait before retrying, honouring `Retry-After` and
+        the rate limit reset time before falling back to backoff.
+        GitHub asks for at least a minute between retries of a secondary rate limit.
+        """
+        headers = headers or {}
+        try:
+            return float(headers["Retry-After"])
+        except (KeyError, TypeError, ValueError):
+            pass
+
+        if headers.get("X-RateLimit-Remaining") == "0":
+            try:
+                return max(float(headers["X-RateLimit-Reset"]) - time.time(), 0.0) + 1
+            except (KeyError, TypeError, ValueError):
+                pass
+
+        if rate_limited:
+            return max(60.0, backoff_seconds(attempt))
+        return backoff_seconds(attempt)
@@ -0,0 +1,275 @@
+import re
+from typing import Dict, List, Optional
+
+from output_parsers import Report, RepositorySummary
+
+FILE_HEADER = re.compile(r'^\s*(?:-\s+)?#{3,4}\s+`?([^`\n]+?)`?\s*$')
+SECTION_END = re.compile(r'^\s*(?:#{1,2}\s|(?:-\s+)?(?:\*\*)?Total Score)', re.IGNORECASE)
+SCORE = re.compile(r'\*\*Score:?\*\*:?\s*([0-9]+(?:\.[0-9]+)?)')
+TOTAL_SCORE = re.compile(r'\*\*Total Score:?\*\*:?\s*([0-9]+(?:\.[0-9]+)?)')
+LABEL = re.compile(r'^\*\*(?:Feedback|Score|Suggestions?):?\*\*:?\s*')
+SENTENCE = re.compile(r'^\s*-\s*\*\*(.+?):?\*\*:?\s*(.+)$')
+
+
+def _match_file(name: str, file_paths: List[str]) -> Optional[str]:
+    # An exact match wins, e.g. `main.tf` over `examples/main.tf`, a partial
+    # path is only used when it fits a single file
+    if name in file_paths:
+        return name
+    matches = {p for p in file_paths if p.endswith("/" + name) or name.endswith("/" + p)}
+    return matches.pop() if len(matches) == 1 else None
+
+
+def parse_file_sections(report: str, file_paths: List[str]) -> Dict[str, Dict]:
+    """
+    Splits a repository report into the feedback section of each file, using
+    the `### <FILE NAME>` headers of the report format.
+
+    Returns `{"score", "feedback"}` per file path, for the files in
+    `file_paths` that have a section. The score is None if the section has
+    none. A file reviewed in more than one chunk gets its sections joined and
+    its scores averaged.
+    """
+    sections: Dict[str, List[str]] = {}
+    current = None
+    in_code = False
+
+    for line in report.splitlines():
+        # HCL comments in code blocks look like markdown headers
+        if line.strip().startswith("```"):
+            in_code = not in_code
+        if in_code or line.strip().startswith("```"):
+            if current is not None:
+                sections[current].append(line)
+            continue
+
+        # Other headers, e.g. `#### Suggestion`, are part of the current section
+        header = FILE_HEADER.match(line)
+        file_path = _match_file(header.group(1).strip(), file_paths) if header else None
+        if file_path is not None:
+            current = file_path
+            sections.setdefault(current, []).append("### " + current)
+            continue
+
+        if SECTION_END.match(line):
+            current = None
+        elif current is not None:
+            sections[current].append(line)
+
+    parsed = {}
+    for file_path, lines in sections.items():
+        feedback = "\n".join(lines).strip()
+        scores = [float(s) for s in SCORE.findall(feedback)]
+        parsed[file_path] = {
+            "score": round(sum(scores) / len(scores), 1) if scores else None,
+            "feedback": feedback,
+        }
+    return parsed
+
+
+def total_score(scores: List[Optional[float]]) -> Optional[float]:
+    """
+    Returns the mean of the scores that are known, to 1 decimal place.
+    """
+    known = [s for s in scores if s is not None]
+    return round(sum(known) / len(known), 1) if known else None
+
+
+def render_repository_report(repo: Dict, sections: Dict[str, Dict]) -> str:
+    """
+    Renders a repository report in the same format as the repository
+    summary prompt asks for, from the feedback section of each file.
+    """
+    file_paths = [f["file_path"] for f in repo["files"]]
+    contents = {f["file_path"]: f.get("content", "") for f in repo["files"]}
+
+    lines = [
+        "# IaC Repository Report",
+        "- **Owner:** " + repo["owner"],
+        "- **Repository:** " + repo["name"],
+        "- **Terraform Files:**",
+    ]
+    lines += ["    - `%s`" % p for p in file_paths]
+    lines += ["", "## Feedback"]
+
+    for file_path in file_paths:
+        section = sections.get(file_path)
+        lines.append("")
+        if section:
+            lines.append(section["feedback"])
+        elif not contents.get(file_path, "").strip():
+            lines.append("### %s\n- **Feedback:** The content of this file could not be fetched, so it was not reviewed." % file_path)
+        else:
+            lines.append("### %s\n- **Feedback:** No feedback was returned for this file." % file_path)
+
+    total = total_score([sections[p]["score"] for p in file_paths if p in sections])
+    lines += ["", "Total Score", "- **Total Score:** %s/10" % (total if total is not None else "N/A"), ""]
+    return "\n".join(lines)
+
+
+def _first_finding(feedback: str) -> Optional[str]:
+    # The first line of feedback text, skipping headers, labels, scores and code
+    in_code = False
+    for line in feedback.splitlines()[1:]:
+        text = line.strip()
+        if text.startswith("```"):
+            in_code = not in_code
+            continue
+        text = text.lstrip("- ").strip()
+        if in_code or not text or SCORE.search(text) or text.startswith(("Current implementation", "Suggested implementation")):
+            continue
+        text = LABEL.sub("", text).strip()
+        # Skip introductions to a list of issues, e.g. "The file has some issues:"
+        if text and not text.endswith(":"):
+            return text
+    return None
+
+
+def top_findings(sections: Dict[str, Dict], limit: int = 3, max_chars: int = 160) -> List[str]:
+    """
+    Returns the first piece of feedback of each of the `limit` lowest scoring
+    files, prefixed with the file path.
+    """
+    ranked = sorted(sections.items(), key=lambda s: (s[1]["score"] is None, s[1]["score"] or 0))
+
+    findings = []
+    for file_path, section in ranked:
+        finding = _first_finding(section["feedback"])
+        if finding:
+            if len(finding) > max_chars:
+                finding = finding[:max_chars - 3].rstrip() + "..."
+            findings.append("`%s`: %s" % (file_path, finding))
+        if len(findings) == limit:
+            break
+    return findings
+
+
+def summarize_repository(repo: Dict, report: str) -> RepositorySummary:
+    """
+    Extracts the per file scores, total score and top findings of a
+    repository report.
+
+    The total is the mean of the file scores, falling back to the total
+    written in the report when no file section could be parsed.
+    """
+    file_paths = [f["file_path"] for f in repo["files"]]
+    sections = parse_file_sections(report, file_paths)
+
+    score = total_score([s["score"] for s in sections.values()])
+    if score is None:
+        totals = TOTAL_SCORE.findall(report)
+        score = float(totals[-1]) if totals else None
+
+    return RepositorySummary(
+        owner=repo["owner"],
+        name=repo["name"],
+        full_name=repo["full_name"],
+        tf_files=file_paths,
+        score=score,
+        file_scores={p: sections[p]["score"] if p in sections else None for p in file_paths},
+        top_findings=top_findings(sections),
+    )
+
+
+def format_score(score: Optional[float]) -> str:
+    if score is None:
+        return "N/A"
+    return ("%.1f" % score).rstrip("0").rstrip(".")
+
+
+def compact_summary(summary: RepositorySummary) -> str:
+    """
+    Returns a repository's scores and top findings in a few lines, as
+    given to the user summary chain instead of the full report.
+    """
+    lines = ["- %s: %s/10 over %s files" % (summary.name, format_score(summary.score), len(summary.tf_files))]
+    lines += ["    - " + finding for finding in summary.top_findings]
+    return "\n".join(lines)
+
+
+def describe_repository(summary: RepositorySummary) -> str:
+    """
+    Returns a one sentence summary of a repository, used when the summary is
+    not written by the LLM.
+    """
+    scores = [s for s in summary.file_scores.values() if s is not None]
+    sentence = "%s Terraform files reviewed" % len(summary.tf_files)
+    if scores:
+        sentence += ", with file scores from %s to %s" % (format_score(min(scores)), format_score(max(scores)))
+    if summary.top_findings:
+        sentence += ". Lowest scoring " + summary.top_findings[0].rstrip(".")
+    return sentence + "."
+
+
+def parse_summary_sentences(text: str, names: List[str]) -> Dict[str, str]:
+    """
+    Returns the sentence for each repository in `names` from the user
+    summary chain's `- **<REPOSITORY NAME>:** <SUMMARY>` lines.
+    """
+    sentences = {}
+    for line in text.splitlines():
+        match = SENTENCE.match(line)
+        if match and match.group(1).strip("` ") in names:
+            sentences[match.group(1).strip("` ")] = match.group(2).strip()
+    return sentences
+
+
+def render_user_summary(username: str,
+                        summaries: List[RepositorySummary],
+                        sentences: Optional[Dict[str, str]] = None) -> Report:
+    """
+    Renders the engineer summary report. Scores and the total are taken from
+    `summaries`, and each repository's summary from `sentences`, or
+    `describe_repository` when it has none.
+    """
+    sentences = sentences or {}
+    total = total_score([s.score for s in summaries])
+
+    lines = [
+        "# Engineer Summary Report: " + username,
+        "- **GitHub User:** " + username,
+        "- **Repositories Analysed**",
+    ]
+    lines += ["    - " + s.name for s in summaries]
+    lines += ["", "### Summary"]
+
+    for s in summaries:
+        lines += [
+            "- " + s.name,
+            "    - " + (sentences.get(s.name) or describe_repository(s)),
+            "    - **Score:** %s/10" % format_score(s.score),
+            "",
+        ]
+
+    lines += ["**Total Score:** %s/10" % format_score(total), ""]
+    return Report(report="\n".join(lines), score=total)
+
+
+def render_org_leaderboard(org: str, summaries: List[RepositorySummary], failed: Optional[List[Dict]] = None) -> Report:
+    """
+    Renders the organization report, ranking repositories by score. The
+    total is the mean of the repository scores.
+    """
+    ranked = sorted(summaries, key=lambda s: (s.score is None, -(s.score or 0), s.name))
+    total = total_score([s.score for s in summaries])
+
+    lines = [
+        "# Organization Leaderboard: " + org,
+        "- **GitHub Organization:** " + org,
+        "- **Repositories Analysed:** %s" % len(summaries),
+        "- **Average Score:** %s/10" % format_score(total),
+        "",
+        "| Rank | Repository | Score | Files | Lowest scoring |",
+        "| -- | -- | -- | -- | -- |",
+    ]
+    for rank, s in enumerate(ranked, 1):
+        finding = s.top_findings[0].replace("|", "\\|") if s.top_findings else ""
+        lines.append("| %s | [%s](%s.md) | %s/10 | %s | %s |" % (
+            rank, s.name, s.name, format_score(s.score), len(s.tf_files), finding))
+
+    if failed:
+        lines += ["", "### Not reviewed"]
+        lines += ["- %s: %s" % (f["payload"]["full_name"], f.get("error", "")) for f in failed]
+
+    lines.append("")
+    return Report(report="\n".join(lines), score=total)
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+
+
+class ReviewCache:
+    """
+    Content addressed cache of LLM generated reports, stored as one markdown
+    file per report.
+
+    Reports are keyed on a hash of everything that is rendered into the
+    prompt: the prompt template, the model and its settings, and every input
+    variable (style guide, file paths and file contents). If any of them
+    change the key changes, so stale reports are never returned.
+
+    - `refresh=True` skips lookups but still stores new reports.
+    - Once more than `max_entries` reports are stored, the least recently
+      used reports are evicted.
+    """
+
+    def __init__(self, directory: str = ".cache/reviews", max_entries: int = 500, refresh: bool = False):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(chain, inputs: Dict[str, Any]) -> str:
+        prompt = getattr(chain, "first", None)
+        llm = getattr(chain, "last", None)
+
+        fingerprint = {
+            "template": getattr(prompt, "template", None),
+            "partial_variables": getattr(prompt, "partial_variables", None),
+            "model_name": getattr(llm, "model_name", None),
+            "temperature": getattr(llm, "temperature", None),
+            "inputs": inputs,
+        }
+        encoded = json.dumps(fingerprint, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".md")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        if self.refresh or not os.path.exists(path):
+            self.misses += 1
+            return None
+
+        with open(path, "r") as file:
+            content = file.read()
+
+        # Mark as recently used
+        os.utime(path)
+        self.hits += 1
+        return content
+
+    def put(self, key: str, content: str):
+        path = self._path(key)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as file:
+            file.write(content)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        entries = [os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.endswith(".md")]
+        if len(entries) <= self.max_entries:
+            return
+
+        entries.sort(key=os.path.getmtime)
+        for path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,107 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Rough size of a generated report, added to the prompt estimate
+DEFAULT_COMPLETION_TOKENS = 1500
+
+
+def is_rate_limit_error(e: Exception) -> bool:
+    return getattr(e, "status_code", None) == 429 or type(e).__name__ == "RateLimitError"
+
+
+def retry_after_seconds(e: Exception) -> Optional[float]:
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Refills `capacity` units evenly over each minute.
+
+    Callers reserve units up front and then sleep until they are refilled,
+    so one bucket can be shared by event loops on several threads.
+    """
+
+    def __init__(self, capacity_per_minute: int):
+        self.capacity = capacity_per_minute
+        self.available = float(capacity_per_minute)
+        self.rate = capacity_per_minute / 60.0
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, amount: int):
+        # A single request larger than the bucket would otherwise wait forever
+        amount = min(amount, self.capacity)
+
+        with self._lock:
+            self._refill()
+            self.available -= amount
+            wait = -self.available / self.rate if self.available < 0 else 0
+
+        if wait:
+            await asyncio.sleep(wait)
+
+
+class LLMScheduler:
+    """
+    Runs LLM calls concurrently while staying inside the provider's
+    requests per minute and tokens per minute budgets.
+
+    - Each call reserves its estimated tokens before it starts.
+    - At most `max_concurrency` calls are in flight.
+    - One scheduler can be shared by reports running on several threads,
+      each with its own event loop, so they share the budgets.
+    - 429 responses are retried with jittered exponential backoff, honouring
+      `Retry-After` when the provider sends it.
+    """
+
+    def __init__(self, requests_per_minute: int = 60,
+                 tokens_per_minute: int = 30000,
+                 max_concurrency: int = 4,
+                 max_retries: int = 5):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        # An asyncio.Semaphore is bound to a single event loop
+        self._semaphore = threading.Semaphore(max_concurrency)
+
+    async def _acquire_slot(self):
+        while not self._semaphore.acquire(blocking=False):
+            await asyncio.sleep(0.05)
+
+    async def run(self, call: Callable[[], Awaitable[T]], estimated_tokens: int) -> T:
+        attempt = 0
+        while True:
+            await self.requests.acquire(1)
+            await self.tokens.acquire(estimated_tokens)
+
+            await self._acquire_slot()
+            try:
+                return await call()
+
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                    raise
+                delay = retry_after_seconds(e) or min(60, 2 ** attempt) * (1 + random.random())
+
+            finally:
+                self._semaphore.release()
+
+            print("Rate limited by LLM provider, retrying in %.1fs" % delay)
+            await asyncio.sleep(delay)
+            attempt += 1
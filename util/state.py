@@ -0,0 +1,79 @@
+from util.blobs import BlobStore
+from util.config import Config
+from util.file_reviews import FileReviewStore
+from util.github import configure_client
+from util.http_cache import HTTPCache
+from util.review_cache import ReviewCache
+from util.scheduler import LLMScheduler
+from util.triage import Triage
+from util.username_cache import UsernameCache
+
+
+class SharedState:
+    """
+    The GitHub client, caches and LLM scheduler used by `create_report`.
+
+    A single run builds its own. A long running process builds them once and
+    passes them to every report, so pooled connections and warm caches are
+    reused across reports. Chains, LLM clients and the style guide are
+    already shared through `lru_cache`.
+    """
+
+    def __init__(self, config: Config):
+        self.http_cache = None
+        if config.get('http_cache'):
+            self.http_cache = HTTPCache(
+                path=config.get('http_cache_path'),
+                max_bytes=config.get('http_cache_max_mb') * 1024 * 1024,
+                ttl_seconds=config.get('http_cache_ttl_days') * 24 * 60 * 60
+            )
+
+        # Share one pooled GitHub client across every stage
+        self.github = configure_client(
+            max_concurrency=config.get('github_concurrency'),
+            cache=self.http_cache,
+            max_retries=config.get('github_max_retries')
+        )
+
+        # Known engineers and plain usernames skip the search agent
+        self.username_cache = None
+        if config.get('username_cache'):
+            self.username_cache = UsernameCache(
+                path=config.get('username_cache_path'),
+                ttl_seconds=config.get('username_cache_ttl_days') * 24 * 60 * 60
+            )
+
+        # Reuse reports for repositories whose prompt inputs have not changed
+        self.review_cache = None
+        if config.get('review_cache'):
+            self.review_cache = ReviewCache(
+                directory=config.get('review_cache_dir'),
+                max_entries=config.get('review_cache_max_entries'),
+                refresh=config.get('refresh_review_cache')
+            )
+
+        # Download each distinct file once, across repositories and reports
+        self.blobs = None
+        if config.get('blob_cache'):
+            self.blobs = BlobStore(directory=config.get('blob_cache_dir'))
+
+        # Only send files that changed since their last review to the LLM
+        self.file_reviews = None
+        if config.get('incremental_review'):
+            self.file_reviews = FileReviewStore(directory=config.get('file_review_dir'))
+
+        # Review repositories concurrently, within the LLM providers rate limits,
+        # which every report sharing this state shares
+        self.scheduler = LLMScheduler(
+            requests_per_minute=config.get('llm_requests_per_minute'),
+            tokens_per_minute=config.get('llm_tokens_per_minute'),
+            max_concurrency=config.get('llm_concurrency')
+        )
+
+        # Score simple, clean files locally, only send the others to the LLM
+        self.triage = None
+        if config.get('triage'):
+            self.triage = Triage(
+                min_score=config.get('triage_min_score'),
+                min_confidence=config.get('triage_min_confidence')
+            )
@@ -0,0 +1,130 @@
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Set
+
+from util.fs import load_file_as_string
+from util.hcl import find_block_types
+
+RULE_HEADER = re.compile(r'^#### ID: (\w+) - Category: (.*)$', re.MULTILINE)
+SECTION_HEADER = re.compile(r'^#{2,3} ', re.MULTILINE)
+
+# The Terraform constructs each rule applies to.
+# "repository" rules are about the repository itself (docs, branch protection,
+# tooling) and cannot be judged from .tf files, so they are only sent in full mode.
+# Rules missing from this table are always sent.
+RULE_CONSTRUCTS = {
+    "TFFR1": ["module"],
+    "TFFR2": ["output"],
+    "TFNFR1": ["variable", "output"],
+    "TFNFR2": ["repository"],
+    "TFNFR3": ["repository"],
+    "TFNFR4": ["locals", "variable", "output", "resource", "data", "module"],
+    "TFNFR5": ["repository"],
+    "TFNFR6": ["resource", "data"],
+    "TFNFR7": ["resource", "data", "module"],
+    "TFNFR8": ["resource", "data"],
+    "TFNFR9": ["module"],
+    "TFNFR10": ["lifecycle"],
+    "TFNFR11": ["variable", "resource"],
+    "TFNFR12": ["dynamic"],
+    "TFNFR13": ["variable", "locals"],
+    "TFNFR14": ["variable"],
+    "TFNFR15": ["variable"],
+    "TFNFR16": ["variable"],
+    "TFNFR17": ["variable"],
+    "TFNFR18": ["variable"],
+    "TFNFR19": ["variable"],
+    "TFNFR20": ["variable"],
+    "TFNFR21": ["variable"],
+    "TFNFR22": ["variable"],
+    "TFNFR23": ["variable"],
+    "TFNFR24": ["variable"],
+    "TFNFR25": ["terraform"],
+    "TFNFR26": ["terraform", "required_providers"],
+    "TFNFR27": ["provider"],
+    "TFNFR28": ["provider"],
+    "TFNFR29": ["output"],
+    "TFNFR30": ["output"],
+    "TFNFR31": ["locals"],
+    "TFNFR32": ["locals"],
+    "TFNFR33": ["locals"],
+    "TFNFR34": ["resource", "variable"],
+    "TFNFR35": ["resource", "variable", "output"],
+    "TFNFR36": ["provider"],
+    "TFNFR37": ["repository"],
+}
+
+
+class StyleGuide:
+    """
+    The style guide parsed into rules, indexed by rule ID and by the
+    Terraform constructs each rule applies to.
+
+    In "relevant" mode `for_files` returns only the rules that apply to the
+    blocks present in the given files. In "full" mode it returns the whole
+    guide, unchanged.
+    """
+
+    def __init__(self, text: str, mode: str = "relevant"):
+        self.text = text
+        self.mode = mode
+        self.rules: Dict[str, str] = {}
+        self.by_construct: Dict[str, List[str]] = {}
+        self.always: List[str] = []
+
+        headers = list(RULE_HEADER.finditer(text))
+        for i, header in enumerate(headers):
+            end = headers[i + 1].start() if i + 1 < len(headers) else len(text)
+
+            # Stop a rule at the next higher level section heading
+            next_section = SECTION_HEADER.search(text, header.end(), end)
+            if next_section:
+                end = next_section.start()
+
+            rule_id = header.group(1)
+            self.rules[rule_id] = _tidy(text[header.start():end])
+
+            constructs = RULE_CONSTRUCTS.get(rule_id)
+            if constructs is None:
+                self.always.append(rule_id)
+                continue
+            for construct in constructs:
+                self.by_construct.setdefault(construct, []).append(rule_id)
+
+    def rule_ids_for(self, constructs: Set[str]) -> List[str]:
+        """
+        Returns the IDs of rules that apply to any of `constructs`, in guide order.
+        """
+        selected = set(self.always)
+        for construct in constructs:
+            selected.update(self.by_construct.get(construct, []))
+        return [rule_id for rule_id in self.rules if rule_id in selected]
+
+    def for_files(self, files: List[Dict], exclude: Iterable[str] = ()) -> str:
+        """
+        Returns the style guide to send with a review of `files`, leaving out
+        the `exclude` rules (e.g. rules already checked without the LLM).
+        """
+        if self.mode == "full":
+            return self.text
+
+        constructs = set()
+        for f in files:
+            constructs.update(find_block_types(f["content"]))
+
+        rule_ids = [r for r in self.rule_ids_for(constructs) if r not in exclude]
+        if not rule_ids:
+            return "No rules in the style guide apply to the blocks used in these files."
+
+        return "\n\n".join(self.rules[rule_id] for rule_id in rule_ids)
+
+
+def _tidy(section: str) -> str:
+    # Drop the page layout separators between rules
+    lines = [l for l in section.strip().splitlines() if l.strip() not in ("<br>", "---")]
+    return re.sub(r'\n{3,}', '\n\n', "\n".join(lines)).strip()
+
+
+@lru_cache(maxsize=None)
+def load_style_guide(path: str = "static/hcl_style_guide.md", mode: str = "relevant") -> StyleGuide:
+    return StyleGuide(load_file_as_string(path), mode=mode)
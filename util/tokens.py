@@ -0,0 +1,87 @@
+from functools import lru_cache
+from typing import Dict, List
+
+
+@lru_cache(maxsize=None)
+def _encoding():
+    # Loaded on first use, the BPE ranks are read from tiktoken's cache or downloaded
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:  # tiktoken is optional
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts tokens with tiktoken when it is installed, otherwise estimates
+    ~4 characters per token.
+    """
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def split_file(file: Dict, max_tokens: int) -> List[Dict]:
+    """
+    Splits a file that is larger than `max_tokens` into chunks of whole
+    lines, preferring to break between top level blocks.
+    Each chunk records the line range it covers, so line numbers stay correct.
+    """
+    if count_tokens(file["content"]) <= max_tokens:
+        return [file]
+
+    lines = file["content"].splitlines(keepends=True)
+    chunks = []
+    start = 0
+    size = 0
+    last_break = None
+
+    for i, line in enumerate(lines):
+        line_tokens = count_tokens(line)
+        if size + line_tokens > max_tokens and i > start:
+            end = last_break if last_break and last_break > start else i
+            chunks.append((start, end))
+            start = end
+            size = sum(count_tokens(l) for l in lines[start:i])
+            last_break = None
+
+        size += line_tokens
+        # A closing brace at column 0 ends a top level block
+        if line.startswith("}"):
+            last_break = i + 1
+
+    chunks.append((start, len(lines)))
+
+    return [{
+        "file_path": file["file_path"],
+        "lines": "%s-%s" % (start + 1, end),
+        "content": "".join(lines[start:end]),
+    } for start, end in chunks if end > start]
+
+
+def pack_files(files: List[Dict], max_tokens: int) -> List[List[Dict]]:
+    """
+    Packs files, in order, into batches of at most `max_tokens` tokens of
+    file content. Files larger than a whole batch are split first.
+    """
+    batches = []
+    batch = []
+    batch_tokens = 0
+
+    for file in files:
+        for part in split_file(file, max_tokens):
+            part_tokens = count_tokens(part["content"])
+            if batch and batch_tokens + part_tokens > max_tokens:
+                batches.append(batch)
+                batch = []
+                batch_tokens = 0
+
+            batch.append(part)
+            batch_tokens += part_tokens
+
+    if batch:
+        batches.append(batch)
+
+    return batches
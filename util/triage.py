@@ -0,0 +1,135 @@
+import re
+import threading
+from typing import Dict, Optional
+
+from util.hcl import scan_blocks
+from util.precheck import check_file
+
+# How much each construct lowers confidence that the local checks found
+# every issue: these are where the style guide's rules that need judgement
+# (ordering, count & for_each use, feature toggles, dynamic blocks, precise
+# types, sensitive values) apply
+CONSTRUCT_WEIGHTS = {
+    "resource": 0.2,
+    "module": 0.2,
+    "dynamic": 0.15,
+    "data": 0.1,
+    "provider": 0.1,
+    "variable": 0.05,
+    "output": 0.05,
+    "locals": 0.05,
+}
+META_ARGUMENT_WEIGHT = 0.1
+META_ARGUMENTS = ("count", "for_each")
+
+# Variables that need judgement: a type using `any` (TFNFR18), or a default
+# for what looks like a secret (TFNFR23)
+JUDGEMENT_WEIGHT = 0.3
+ANY_TYPE = re.compile(r'\bany\b')
+SECRET_NAME = re.compile(r'pass|secret|token|key|credential', re.IGNORECASE)
+
+# Files longer than this many lines lose LINES_WEIGHT of confidence per extra LINES_STEP lines
+SHORT_FILE_LINES = 50
+LINES_STEP = 50
+LINES_WEIGHT = 0.05
+
+# Files longer than this are always sent to the full review
+MAX_LINES = 100
+
+
+class Triage:
+    """
+    Cheap first tier of the review. Every file is checked locally, with the
+    pre-check rules, and given a score and a confidence.
+
+    Files scoring at least `min_score`, with a confidence of at least
+    `min_confidence`, are scored from the local checks alone, e.g. a
+    `versions.tf` or a short `outputs.tf`. 1 point is taken off per finding,
+    so by default only files without findings are. Every other file
+    is escalated to the full LLM review.
+
+    Confidence is 1 for a short file of `terraform` blocks, and lower the
+    more resources, modules, dynamic blocks, `count`/`for_each`, variables,
+    outputs and locals it has, and the longer it is. Variables typed with
+    `any`, or with a default for what looks like a secret, lower it most.
+    Empty files, and files longer than `MAX_LINES`, are always escalated.
+    """
+
+    def __init__(self, min_score: float = 10, min_confidence: float = 0.7):
+        self.min_score = min_score
+        self.min_confidence = min_confidence
+        self.triaged = 0
+        self.escalated = 0
+        self._lock = threading.Lock()
+
+    def assess(self, file_path: str, content: str) -> Dict:
+        """
+        Returns the local score, confidence and findings of a file.
+        """
+        findings = check_file(file_path, content)
+
+        confidence = 1.0
+        for block in scan_blocks(content):
+            for b in [block] + list(block.walk()):
+                confidence -= CONSTRUCT_WEIGHTS.get(b.type, 0)
+                confidence -= META_ARGUMENT_WEIGHT * sum(1 for a in META_ARGUMENTS if a in b.attributes)
+
+            if block.type == "variable":
+                name = block.labels[0] if block.labels else ""
+                if "type" in block.attributes and ANY_TYPE.search(block.attributes["type"].value):
+                    confidence -= JUDGEMENT_WEIGHT
+                if "default" in block.attributes and SECRET_NAME.search(name):
+                    confidence -= JUDGEMENT_WEIGHT
+
+        lines = len(content.strip().splitlines())
+        # An empty file may have failed to download, so it is never scored as clean
+        if lines == 0 or lines > MAX_LINES:
+            confidence = 0.0
+        elif lines > SHORT_FILE_LINES:
+            confidence -= LINES_WEIGHT * -(-(lines - SHORT_FILE_LINES) // LINES_STEP)
+
+        return {
+            "score": max(0, 10 - len(findings)),
+            "confidence": round(max(0.0, confidence), 2),
+            "findings": findings,
+        }
+
+    def review(self, file_path: str, content: str) -> Optional[Dict]:
+        """
+        Returns the `{"score", "feedback"}` section of a file that does not
+        need the full review, or None if it should be escalated.
+        """
+        assessment = self.assess(file_path, content)
+        if assessment["score"] < self.min_score or assessment["confidence"] < self.min_confidence:
+            with self._lock:
+                self.escalated += 1
+            return None
+
+        with self._lock:
+            self.triaged += 1
+        return {
+            "score": float(assessment["score"]),
+            "feedback": format_section(file_path, assessment),
+        }
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "triaged": self.triaged,
+                "escalated": self.escalated,
+            }
+
+
+def format_section(file_path: str, assessment: Dict) -> str:
+    """
+    Renders a triaged file's section in the same format as the repository
+    summary prompt asks for.
+    """
+    lines = ["### " + file_path, "- **Feedback:**"]
+    if assessment["findings"]:
+        lines += ["  - Line %s: %s (%s)" % (f["line"], f["message"], f["rule"]) for f in assessment["findings"]]
+    else:
+        lines.append("  - No issues found by the local style checks.")
+    lines.append("- **Score:** %s/10 (triage, confidence %.2f)" % (assessment["score"], assessment["confidence"]))
+    return "\n".join(lines)
+
@@ -0,0 +1,51 @@
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+
+class UsernameCache:
+    """
+    Persistent cache of search query to GitHub username, stored as JSON.
+    Entries older than `ttl_seconds` are ignored.
+    """
+
+    def __init__(self, path: str = ".cache/usernames.json", ttl_seconds: int = 30 * 24 * 60 * 60):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def _read(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as file:
+                return json.load(file)
+        except ValueError:
+            return {}
+
+    def get(self, query: str) -> Optional[str]:
+        with self._lock:
+            entry = self._read().get(self._normalize(query))
+
+        if entry is None or time.time() - entry["stored_at"] > self.ttl_seconds:
+            return None
+        return entry["username"]
+
+    def put(self, query: str, username: str):
+        with self._lock:
+            entries = self._read()
+            entries[self._normalize(query)] = {"username": username, "stored_at": time.time()}
+
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = "%s.%s.tmp" % (self.path, os.getpid())
+            with open(tmp_path, "w") as file:
+                json.dump(entries, file, indent=2)
+            os.replace(tmp_path, self.path)
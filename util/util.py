@@ -1,109 +1,249 @@
 import requests
-import os
-import dateutil.parser
-import base64
-from typing import List, Dict
+import tarfile
+from typing import List, Dict, NamedTuple, Optional
 
-gh_pat = os.environ.get('GH_PAT')
+from util.blobs import BlobStore
+from util.github import get_client
+from util.rate_limit import GitHubError
 
-def get_hcl_repositories(username: str, max_repos: int = 3) -> list:
+# How GitHub can order a user's repositories, most recent first
+REPO_SORTS = ["pushed", "updated"]
+
+
+class Repository(NamedTuple):
+    """
+    The fields of a GitHub repository that the report uses, instead of the
+    full API response.
     """
-    Returns list of all public repositories for a given GitHub username.
-    - sorted by updated_at 
+    owner: str
+    name: str
+    full_name: str
+    default_branch: str
+    pushed_at: str
+    updated_at: str
+    hcl_share: float
+
+    def to_dict(self) -> Dict:
+        return dict(self._asdict())
+
+
+def get_hcl_repositories(username: str,
+                         max_repos: int = 3,
+                         sort: str = "pushed",
+                         min_hcl_share: float = 0.5,
+                         owner_type: str = "user") -> List[Repository]:
+    """
+    Returns public repositories for a given GitHub username, or organization
+    when `owner_type` is "org".
+    - sorted by GitHub, most recently pushed (or updated) first
 
     Removing repostories that:
     - Dont contain > 50% HCL code
     - Are a fork
 
-    Upto a maximum of `max` repositories are returned.
+    Upto a maximum of `max` repositories are returned. Pages of 100
+    repositories are requested until enough are found, and language byte
+    counts are only fetched for non fork repositories whose primary
+    language is HCL.
     """
 
-    repos_url = f"https://api.github.com/users/{username}/repos"
-    headers = {
-        "Accept": "application/vnd.github.v3+json",
-        "Authorization": "Bearer "+ gh_pat,
-        }
+    client = get_client()
+    if owner_type == "org":
+        repos_url = f"orgs/{username}/repos"
+        params = {"type": "sources", "sort": sort, "direction": "desc", "per_page": 100}
+    else:
+        repos_url = f"users/{username}/repos"
+        params = {"type": "owner", "sort": sort, "direction": "desc", "per_page": 100}
     hcl_repos = []
 
     try:
-        # GitHubs API paginates responses, so we need to loop through all pages
-        while repos_url:
+        # GitHubs API paginates responses, so we need to loop until enough repositories are found
+        while repos_url and len(hcl_repos) < max_repos:
 
-            response = requests.get(repos_url, headers=headers)
+            response = client.get(repos_url, params=params)
             response.raise_for_status()  # Raises an error for bad responses
-            repos = response.json()
-
-            # sort by updated_at
-            sorted_repos = sort_repositories_by_updated_at(repos)
-
-            # Iterate through each repo in the response and check for
-            # HCL code and not a fork
-            for repo in sorted_repos:
 
-                # Skip forked repos
-                if repo['fork']:
-                    continue
-
-                # Add the repo to list if it contains >=50% HCL code
-                if repo["language"] == "HCL":
-                    hcl_repos.append(repo)
-
-            # Check for the 'next' link in the response headers
-            links = response.headers.get('Link', None)
-            if links and 'rel="next"' in links:
-                repos_url = links.split(';')[0].strip('<>')
-            else:
-                repos_url = None
+            # A repository can only be > 50% HCL if HCL is its primary language
+            candidates = [r for r in response.json() if not r["fork"] and r["language"] == "HCL"]
+
+            # Check only as many candidates as are still needed, in parallel
+            while candidates and len(hcl_repos) < max_repos:
+                needed = max_repos - len(hcl_repos)
+                batch, candidates = candidates[:needed], candidates[needed:]
+                shares = client.map(lambda r: get_hcl_share(r["full_name"]), batch)
+
+                for repo, share in zip(batch, shares):
+                    if share > min_hcl_share:
+                        hcl_repos.append(Repository(
+                            owner=repo["owner"]["login"],
+                            name=repo["name"],
+                            full_name=repo["full_name"],
+                            default_branch=repo.get("default_branch") or "HEAD",
+                            pushed_at=repo.get("pushed_at") or "",
+                            updated_at=repo.get("updated_at") or "",
+                            hcl_share=round(share, 3),
+                        ))
+
+            # The 'next' link already carries the query parameters
+            repos_url = next_page_url(response.headers.get('Link'))
+            params = None
 
     except requests.exceptions.RequestException as e:
+        # A user or organization that does not exist has no repositories
+        if not is_not_found(e):
+            raise GitHubError(f"Error fetching repositories: {e}") from e
         print(f"Error fetching repositories: {e}")
 
     print("HCL repositories: ")
-    [print("- " + r["full_name"]) for r in hcl_repos]
+    [print("- %s (%.0f%% HCL)" % (r.full_name, r.hcl_share * 100)) for r in hcl_repos]
 
     return hcl_repos[:max_repos]
 
 
+def is_not_found(e: requests.exceptions.RequestException) -> bool:
+    """
+    Whether a failed request failed because GitHub says what it asked for
+    does not exist. Every other failure is raised as a `GitHubError`.
+    """
+    return isinstance(e, requests.exceptions.HTTPError) and e.response is not None and e.response.status_code == 404
+
 
-def sort_repositories_by_updated_at(repositories: List[Dict]) -> List[Dict]:
+def next_page_url(links: Optional[str]) -> Optional[str]:
+    """
+    Returns the rel="next" URL from a `Link` header, if there is one.
+    """
+    for link in (links or "").split(","):
+        url, _, rel = link.partition(";")
+        if 'rel="next"' in rel:
+            return url.strip().strip("<>")
+    return None
 
-    # Convert the 'updated_at' string to a datetime object for sorting
-    for repo in repositories:
-        repo['updated_at'] = dateutil.parser.parse(repo['updated_at'])
 
-    # Sort the repositories by 'updated_at' in descending order
-    sorted_repositories = sorted(repositories, key=lambda x: x['updated_at'], reverse=True)
+def get_hcl_share(repo_full_name: str) -> float:
+    """
+    Returns the share of a repository's code, in bytes, that is HCL.
+    """
+    try:
+        response = get_client().get(f"repos/{repo_full_name}/languages")
+        response.raise_for_status()
+        languages = response.json()
 
-    # Convert 'updated_at' back to string if necessary for further processing
-    for repo in sorted_repositories:
-        repo['updated_at'] = repo['updated_at'].isoformat()
+    except requests.exceptions.RequestException as e:
+        if not is_not_found(e):
+            raise GitHubError(f"Error fetching repository languages: {e}") from e
+        print(f"Error fetching repository languages: {e}")
+        return 0.0
 
-    return sorted_repositories
+    total = sum(languages.values())
+    return languages.get("HCL", 0) / total if total else 0.0
 
-def find_hcl_files_in_repos(repos: List[Dict], 
+def find_hcl_files_in_repos(repos: List[Repository], 
                             max_files_per_repo: int, 
                             max_depth_per_repo: int,
+                            discovery_mode: str = "tree",
                             ) -> List[Dict]:
     """
     Returns a list of repositories that contain Terraform files (.tf).
-    Each repository object contains a list of Terraform files found in the repository.
-    """
-    repos_with_filenames = []
-    for r in repos:
-       repos_with_filenames.append({
-           "owner": r["owner"]["login"],
-           "name": r["name"],
-           "full_name": r["full_name"],
-           "hcl_files": get_hcl_filenames(
-                 username=r["owner"]["login"],
-                 repo=r["name"],
-                 path="",
-                 max_files_per_repo=max_files_per_repo,
-                 max_depth_per_repo=max_depth_per_repo,
-            )
-    })
-
-    return repos_with_filenames
+    Each repository object contains a list of Terraform files found in the repository,
+    and the blob SHA of each file when it is known.
+
+    Repositories are searched in parallel, see `find_hcl_files_in_repo`.
+    """
+    return get_client().map(
+        lambda r: find_hcl_files_in_repo(r, max_files_per_repo, max_depth_per_repo, discovery_mode),
+        repos,
+    )
+
+
+def find_hcl_files_in_repo(r: Repository,
+                           max_files_per_repo: int,
+                           max_depth_per_repo: int,
+                           discovery_mode: str = "tree") -> Dict:
+    """
+    Returns a repository with the list of Terraform files (.tf) found in it,
+    and the blob SHA of each file when it is known, using either:
+    - "tree": a single recursive Git Trees API request.
+    - "contents": one contents API request per directory.
+    """
+    hcl_files = None
+    if discovery_mode == "tree":
+        hcl_files = get_hcl_files_from_tree(
+             username=r.owner,
+             repo=r.name,
+             ref=r.default_branch,
+             max_files_per_repo=max_files_per_repo,
+             max_depth_per_repo=max_depth_per_repo,
+        )
+
+    # Fall back to crawling the contents API
+    if hcl_files is None:
+        hcl_files = [{"path": p, "sha": None} for p in get_hcl_filenames(
+             username=r.owner,
+             repo=r.name,
+             path="",
+             max_files_per_repo=max_files_per_repo,
+             max_depth_per_repo=max_depth_per_repo,
+        )]
+
+    return {
+       "owner": r.owner,
+       "name": r.name,
+       "full_name": r.full_name,
+       "hcl_files": [f["path"] for f in hcl_files],
+       "hcl_file_shas": {f["path"]: f["sha"] for f in hcl_files if f["sha"]},
+    }
+
+
+def get_hcl_files_from_tree(username: str,
+                            repo: str,
+                            ref: str = "HEAD",
+                            max_files_per_repo: int = 5,
+                            max_depth_per_repo: int = 1) -> Optional[List[Dict]]:
+    """
+    Fetches .tf files from a GitHub repository with a single recursive
+    Git Trees API request, filtering paths in memory.
+
+    Args:
+    - username (str): The GitHub username or organization name.
+    - repo (str): The repository name.
+    - ref (str): The branch, tag or tree SHA to read, default is HEAD.
+    - max_files_per_repo (int): Stop once this many files are found.
+    - max_depth_per_repo (int): The maximum number of directories a file can be nested in.
+
+    Returns:
+    - list: A list of `{"path", "sha"}` dicts, in tree order.
+    - None: If GitHub says the tree does not exist, or truncated it.
+    """
+    try:
+        response = get_client().get(f"repos/{username}/{repo}/git/trees/{ref}", params={"recursive": "1"})
+        response.raise_for_status()
+        tree = response.json()
+
+    except requests.exceptions.RequestException as e:
+        if not is_not_found(e):
+            raise GitHubError(f"Error fetching repository tree: {e}") from e
+        print(f"Error fetching repository tree: {e}")
+        return None
+
+    if tree.get("truncated"):
+        print(f"Repository tree for {username}/{repo} is truncated, crawling contents instead")
+        return None
+
+    hcl_files = []
+    for item in tree.get("tree", []):
+        if len(hcl_files) >= max_files_per_repo:
+            break
+
+        if item["type"] != "blob" or not item["path"].endswith(".tf"):
+            continue
+
+        # Depth is the number of directories the file is nested in
+        if item["path"].count("/") > max_depth_per_repo:
+            continue
+
+        hcl_files.append({"path": item["path"], "sha": item["sha"]})
+
+    return hcl_files
 
 
 def get_hcl_filenames(username: str, 
@@ -114,6 +254,9 @@ def get_hcl_filenames(username: str,
     """
     Fetches a list of .tf files from a GitHub repository, with configurable search depth.
 
+    Every directory at the same depth is listed in parallel, then the results
+    are walked in the same order as a depth first crawl.
+
     Args:
     - username (str): The GitHub username or organization name.
     - repo (str): The repository name.
@@ -125,67 +268,115 @@ def get_hcl_filenames(username: str,
     """
     depth = max_depth_per_repo
 
-
     if depth < 0:
         return []  # Stop recursion if maximum depth is reached
-    api_url = f"https://api.github.com/repos/{username}/{repo}/contents/{path}"
-    headers = {
-        "Accept": "application/vnd.github.v3+json",
-        "Authorization": "Bearer "+ gh_pat,
-        }
-    hcl_files = []
 
-    try:
-        response = requests.get(api_url, headers=headers)
-        response.raise_for_status()
-        contents = response.json()
+    client = get_client()
+    listings = {}
+    dirs = [path]
+
+    while dirs and depth >= 0:
+        for d, contents in zip(dirs, client.map(lambda d: list_directory(username, repo, d), dirs)):
+            listings[d] = contents
 
-        for item in contents:
+        # Only descend while there is depth remaining
+        dirs = [item['path'] for d in dirs for item in listings[d]
+                if item['type'] == 'dir' and depth > 0]
+        depth -= 1
+
+    def walk(d: str) -> List[str]:
+        hcl_files = []
+        for item in listings.get(d, []):
             if item['type'] == 'file' and item['name'].endswith('.tf'):
                 hcl_files.append(item['path'])
 
-            elif item['type'] == 'dir' and depth > 0:
-                # Recursively search in directories, decrementing depth
-                hcl_files.extend(get_hcl_filenames(username, 
-                                                   repo=repo, 
-                                                   path=item['path'], 
-                                                   max_files_per_repo=99,
-                                                   max_depth_per_repo=depth - 1))
+            elif item['type'] == 'dir' and item['path'] in listings:
+                hcl_files.extend(walk(item['path']))
+        return hcl_files
+
+    return walk(path)[:max_files_per_repo]
+
+
+def list_directory(username: str, repo: str, path: str = '') -> List[Dict]:
+    """
+    Returns the GitHub contents listing of a single directory in a repository.
+    """
+    try:
+        response = get_client().get(f"repos/{username}/{repo}/contents/{path}")
+        response.raise_for_status()
+        return response.json()
 
     except requests.exceptions.RequestException as e:
+        if not is_not_found(e):
+            raise GitHubError(f"Error fetching repository contents: {e}") from e
         print(f"Error fetching repository contents: {e}")
+        return []
 
-    return hcl_files[:max_files_per_repo]
-
-def get_tf_file_contents_from_repos(repos: List[Dict], max: int = 5) -> List[Dict]:
+def get_tf_file_contents_from_repos(repos: List[Dict],
+                                    max: int = 5,
+                                    fetch_mode: str = "contents",
+                                    blobs: Optional[BlobStore] = None) -> List[Dict]:
     """
     Returns the content of each .tf file in the given list of repositories.
-    """
-    
-    repos_with_contents = []
-    for repo in repos:
-        file_count = 0
-        contents = []
 
-        for file_path in repo["hcl_files"]:
-            file_count += 1
-            if file_count > max:
-                break
+    Repositories, and the files in each, are downloaded in parallel, see
+    `get_tf_file_contents_from_repo`.
+    """
+    return get_client().map(lambda repo: get_tf_file_contents_from_repo(repo, max, fetch_mode, blobs), repos)
 
-            content = get_file_content(repo["full_name"], file_path)
-            contents.append({
-                "file_path": file_path,
-                "content": content,
-            })
 
-        repos_with_contents.append({
-            "owner": repo["owner"],
-            "name": repo["name"],
-            "full_name": repo["full_name"],
-            "files": contents,
-        })
+def get_tf_file_contents_from_repo(repo: Dict,
+                                   max: int = 5,
+                                   fetch_mode: str = "contents",
+                                   blobs: Optional[BlobStore] = None) -> Dict:
+    """
+    Returns a repository with the content of each of its .tf files, using either:
+    - "contents": one contents API request per file, in parallel.
+    - "archive": one streamed tarball.
 
-    return repos_with_contents
+    With `blobs`, files whose blob SHA is known are read from the store, or
+    downloaded once and stored, so copies of a file in other repositories
+    are not downloaded again.
+    """
+    file_paths = repo["hcl_files"][:max]
+    shas = repo.get("hcl_file_shas", {})
+
+    contents_by_file = {}
+    if blobs and fetch_mode == "archive":
+        # Only fetch the archive when some files are not stored yet
+        for file_path in file_paths:
+            content = blobs.get(shas[file_path]) if file_path in shas else None
+            if content is not None:
+                contents_by_file[file_path] = content
+    missing = [p for p in file_paths if p not in contents_by_file]
+
+    if fetch_mode == "archive":
+        if missing:
+            contents_by_file.update(get_tf_file_contents_from_archive(repo["full_name"], paths=missing))
+            if blobs:
+                for file_path in missing:
+                    if contents_by_file.get(file_path):
+                        blobs.put(contents_by_file[file_path], downloaded=True)
+    else:
+        def download(file_path: str) -> str:
+            if blobs is None:
+                return get_file_content(repo["full_name"], file_path)
+            if file_path not in shas:
+                content = get_file_content(repo["full_name"], file_path)
+                if content:
+                    blobs.put(content, downloaded=True)
+                return content
+            return blobs.fetch(shas[file_path], lambda: get_file_content(repo["full_name"], file_path))
+
+        contents_by_file.update(zip(missing, get_client().map(download, missing)))
+
+    return {
+        "owner": repo["owner"],
+        "name": repo["name"],
+        "full_name": repo["full_name"],
+        "files": [{"file_path": p, "content": contents_by_file.get(p, "")} for p in file_paths],
+        "hcl_file_shas": repo.get("hcl_file_shas", {}),
+    }
 
 def get_file_content(repo_full_name: str, file_path: str) -> str:
     """
@@ -196,25 +387,87 @@ def get_file_content(repo_full_name: str, file_path: str) -> str:
     - file_path (str): The path to the file within the repository.
 
     Returns:
-    - str: The content of the file.
-    """
-    api_url = f"https://api.github.com/repos/{repo_full_name}/contents/{file_path}"
-    headers = {
-        "Accept": "application/vnd.github.v3+json",
-        "Authorization": "Bearer "+ gh_pat,
-        }
-    
+    - str: The content of the file, or "" if GitHub says it does not exist.
+
+    Raises:
+    - GitHubError: If the request failed for any other reason, e.g. a bad token,
+      or is still rate limited or failing after every retry.
+    """
     try:
-        response = requests.get(api_url, headers=headers)
+        # The raw media type returns the file itself, instead of base64 in a JSON envelope
+        response = get_client().get(f"repos/{repo_full_name}/contents/{file_path}",
+                                    headers={"Accept": "application/vnd.github.raw"})
         response.raise_for_status()  # Raises an error for bad responses
-        content_data = response.json()
 
         print("Getting content for file: " + repo_full_name + "/" + file_path)
 
-        # Decode the base64 encoded content
-        file_content = base64.b64decode(content_data['content']).decode('utf-8')
-        return file_content
+        return response.content.decode('utf-8')
 
     except requests.exceptions.RequestException as e:
+        if not is_not_found(e):
+            raise GitHubError(f"Error fetching file content: {e}") from e
         print(f"Error fetching file content: {e}")
-        return ""
\ No newline at end of file
+        return ""
+
+
+def get_tf_file_contents_from_archive(repo_full_name: str,
+                                      paths: Optional[List[str]] = None,
+                                      max_files: int = 5,
+                                      max_depth: int = 3) -> Dict[str, str]:
+    """
+    Streams the default branch tarball of a repository and extracts .tf files
+    in memory, without writing the archive to disk.
+
+    Args:
+    - repo_full_name (str): The full name of the repository (e.g., "octocat/Hello-World").
+    - paths (list): Only extract these files. Reading stops once all of them are found.
+    - max_files (int): When `paths` is not given, the maximum number of files to extract.
+    - max_depth (int): When `paths` is not given, the maximum number of directories a file can be nested in.
+
+    Returns:
+    - dict: File path to file content.
+    """
+    wanted = set(paths) if paths is not None else None
+    if wanted is not None and not wanted:
+        return {}
+
+    file_contents = {}
+
+    try:
+        with get_client().get(f"repos/{repo_full_name}/tarball", stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+
+            print("Streaming archive for repository: " + repo_full_name)
+
+            with tarfile.open(fileobj=response.raw, mode="r|gz") as archive:
+                for member in archive:
+                    if not member.isfile():
+                        continue
+
+                    # Members are prefixed with a "<owner>-<repo>-<sha>/" directory
+                    file_path = member.name.split("/", 1)[-1]
+                    if not file_path.endswith(".tf"):
+                        continue
+
+                    if wanted is not None:
+                        if file_path not in wanted:
+                            continue
+                    elif file_path.count("/") > max_depth:
+                        continue
+
+                    file_contents[file_path] = archive.extractfile(member).read().decode('utf-8')
+
+                    if wanted is not None and len(file_contents) == len(wanted):
+                        break
+                    if wanted is None and len(file_contents) >= max_files:
+                        break
+
+    except requests.exceptions.RequestException as e:
+        if not is_not_found(e):
+            raise GitHubError(f"Error fetching repository archive: {e}") from e
+        print(f"Error fetching repository archive: {e}")
+    except tarfile.TarError as e:
+        print(f"Error reading repository archive: {e}")
+
+    return file_contents
@@ -0,0 +1,151 @@
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+STATES = ("pending", "claimed", "done", "failed")
+
+
+class WorkQueue:
+    """
+    Durable work queue stored as one JSON file per item, in a directory per
+    state: pending, claimed, done and failed.
+
+    Items are claimed by renaming them from pending/ to claimed/, which is
+    atomic, so any number of processes, on any number of machines sharing
+    the directory, can drain the same queue without a server or locks.
+
+    - A claim is a lease. Workers call `heartbeat` while they work, and
+      items whose claim has not been renewed for `lease_seconds` (e.g. the
+      worker was killed) are returned to pending.
+    - A failed item is retried until it has failed `max_attempts` times,
+      then moved to failed/.
+    """
+
+    def __init__(self, path: str, lease_seconds: int = 600, max_attempts: int = 3):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        for state in STATES:
+            os.makedirs(os.path.join(path, state), exist_ok=True)
+
+    def _file(self, state: str, item_id: str) -> str:
+        return os.path.join(self.path, state, item_id + ".json")
+
+    def _ids(self, state: str) -> List[str]:
+        return sorted(f[:-len(".json")] for f in os.listdir(os.path.join(self.path, state)) if f.endswith(".json"))
+
+    def _read(self, path: str) -> Dict[str, Any]:
+        with open(path, "r") as file:
+            return json.load(file)
+
+    def _write(self, path: str, item: Dict[str, Any]):
+        # Write then rename, so other processes never see a partial file
+        tmp_path = "%s.%s.tmp" % (path, os.getpid())
+        with open(tmp_path, "w") as file:
+            json.dump(item, file, indent=2, default=str)
+        os.replace(tmp_path, path)
+
+    def clear(self):
+        for state in STATES:
+            for item_id in self._ids(state):
+                try:
+                    os.remove(self._file(state, item_id))
+                except FileNotFoundError:
+                    pass
+
+    def put(self, item_id: str, payload: Dict[str, Any]) -> bool:
+        """
+        Queues an item, unless an item with the same id is already queued,
+        claimed, done or failed. Returns whether it was queued.
+        """
+        if any(os.path.exists(self._file(state, item_id)) for state in STATES):
+            return False
+        self._write(self._file("pending", item_id), {"id": item_id, "payload": payload, "attempts": 0})
+        return True
+
+    def requeue_expired(self) -> int:
+        """
+        Returns items whose lease expired to pending, returning how many were.
+        """
+        requeued = 0
+        for item_id in self._ids("claimed"):
+            path = self._file("claimed", item_id)
+            try:
+                if time.time() - os.path.getmtime(path) < self.lease_seconds:
+                    continue
+                os.rename(path, self._file("pending", item_id))
+                requeued += 1
+            except FileNotFoundError:
+                # Completed or requeued by another worker in the meantime
+                pass
+        return requeued
+
+    def claim(self) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Claims the next pending item, returning its id and payload, or None
+        when nothing is pending.
+        """
+        self.requeue_expired()
+        for item_id in self._ids("pending"):
+            path = self._file("claimed", item_id)
+            try:
+                os.rename(self._file("pending", item_id), path)
+            except FileNotFoundError:
+                # Claimed by another worker first
+                continue
+
+            # Start the lease now, rename keeps the pending file's mtime
+            os.utime(path)
+            return item_id, self._read(path)["payload"]
+        return None
+
+    def heartbeat(self, item_id: str):
+        try:
+            os.utime(self._file("claimed", item_id))
+        except FileNotFoundError:
+            pass
+
+    def complete(self, item_id: str, result: Dict[str, Any]):
+        claimed = self._file("claimed", item_id)
+        try:
+            item = self._read(claimed)
+        except FileNotFoundError:
+            # The lease expired and the item was requeued, keep this result anyway
+            item = {"id": item_id, "attempts": 0}
+
+        item.update(result=result, completed_at=time.time())
+        self._write(self._file("done", item_id), item)
+        for path in (claimed, self._file("pending", item_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def fail(self, item_id: str, error: str):
+        claimed = self._file("claimed", item_id)
+        try:
+            item = self._read(claimed)
+        except FileNotFoundError:
+            return
+
+        item["attempts"] += 1
+        item["error"] = error
+        state = "failed" if item["attempts"] >= self.max_attempts else "pending"
+        self._write(self._file(state, item_id), item)
+        try:
+            os.remove(claimed)
+        except FileNotFoundError:
+            pass
+
+    def items(self, state: str) -> List[Dict[str, Any]]:
+        items = []
+        for item_id in self._ids(state):
+            try:
+                items.append(self._read(self._file(state, item_id)))
+            except FileNotFoundError:
+                pass
+        return items
+
+    def counts(self) -> Dict[str, int]:
+        return {state: len(self._ids(state)) for state in STATES}